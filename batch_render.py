@@ -0,0 +1,217 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import time
+
+from db_pool import connect_read_only, pool
+from event_renderer import fetch_event, render_event_png
+from image_pack import ImagePack, write_pack
+
+EVENTS_QUERY = """
+SELECT event_number FROM tracks
+UNION
+SELECT event_number FROM calo_hits
+ORDER BY event_number
+"""
+# Next to each output, records what its images were rendered from
+STAMP_SUFFIX = ".stamp.json"
+
+worker_conn = None
+worker_render = None
+
+
+def init_worker(database_path, view="2d"):
+    global worker_conn, worker_render
+    # Nothing writes to the database during a batch, so skip locking
+    worker_conn = connect_read_only(database_path, immutable=True)
+    if view == "3d":
+        # Imported here so 2D batches do not need VTK. Each worker gets its
+        # own offscreen render window on first use.
+        from detector_scene import render_event_png_3d
+        worker_render = render_event_png_3d
+    else:
+        worker_render = render_event_png
+
+
+def render_to_file(job):
+    event_number, output_path = job
+    start = time.perf_counter()
+    tracks, calo_hits = fetch_event(worker_conn, event_number)
+    fetched = time.perf_counter()
+    data = worker_render(event_number, tracks, calo_hits)
+    rendered = time.perf_counter()
+    scratch_path = output_path + ".tmp"
+    with open(scratch_path, "wb") as output_file:
+        output_file.write(data)
+    os.replace(scratch_path, output_path)
+    return event_number, len(data), fetched - start, rendered - fetched
+
+
+def list_events(database_path):
+    return [row[0] for row in pool.fetchall(database_path, EVENTS_QUERY, label="list events")]
+
+
+def source_stamp(database_path, view):
+    # The view and a digest of the rows the images are drawn from. Not the
+    # file's mtime or change counter: opening the database in the app
+    # writes indexes, ANALYZE results and the stored summary into it.
+    # Reading every row is cheap next to rendering every event.
+    digest = hashlib.sha1()
+    with pool.connection(database_path) as conn:
+        for table in ("tracks", "calo_hits"):
+            cursor = conn.execute(f"SELECT * FROM {table} ORDER BY rowid")
+            rows = cursor.fetchmany(100000)
+            while rows:
+                digest.update(repr(rows).encode())
+                rows = cursor.fetchmany(100000)
+    return {"view": view, "source": digest.hexdigest()}
+
+
+def read_stamp(path):
+    try:
+        with open(path) as stamp_file:
+            return json.load(stamp_file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_stamp(path, stamp):
+    with open(path + ".tmp", "w") as stamp_file:
+        json.dump(stamp, stamp_file)
+    os.replace(path + ".tmp", path)
+
+
+def is_up_to_date(path, stamp_mtime):
+    return os.path.exists(path) and os.path.getmtime(path) >= stamp_mtime
+
+
+def report_progress(done, total, start_time, last_report):
+    now = time.perf_counter()
+    if done != total and now - last_report < 1.0:
+        return last_report
+    elapsed = now - start_time
+    rate = done / elapsed if elapsed > 0 else 0.0
+    remaining = (total - done) / rate if rate > 0 else 0.0
+    print(f"  {done}/{total} events, {rate:.1f} events/s, {remaining:.0f}s left", flush=True)
+    return now
+
+
+def run_jobs(database_path, worker, jobs, num_workers, on_result=None, view="2d"):
+    start_time = time.perf_counter()
+    last_report = start_time
+    with multiprocessing.Pool(num_workers, initializer=init_worker, initargs=(database_path, view)) as pool:
+        for done, result in enumerate(pool.imap_unordered(worker, jobs, chunksize=8), start=1):
+            if on_result is not None:
+                on_result(result)
+            last_report = report_progress(done, len(jobs), start_time, last_report)
+    return time.perf_counter() - start_time
+
+
+def render_directory(database_path, output_dir, run_number, num_workers, force, skip=(), view="2d", only=None,
+                     stamp=None):
+    os.makedirs(output_dir, exist_ok=True)
+    # Images count as fresh if they were written after the stamp. The stamp
+    # is only rewritten when the events or the view change, so an
+    # interrupted batch resumes and everything rendered from older data or
+    # in the other view is redone.
+    stamp_path = os.path.join(output_dir, f"{run_number}{STAMP_SUFFIX}")
+    if stamp is None:
+        stamp = source_stamp(database_path, view)
+    if read_stamp(stamp_path) != stamp:
+        write_stamp(stamp_path, stamp)
+    stamp_mtime = os.path.getmtime(stamp_path)
+
+    jobs = []
+    events = list_events(database_path)
+    if only is not None:
+        events = [event_number for event_number in events if event_number in only]
+    for event_number in events:
+        if event_number in skip:
+            continue
+        output_path = os.path.join(output_dir, f"{run_number}_{event_number}.png")
+        if force or not is_up_to_date(output_path, stamp_mtime):
+            jobs.append((event_number, output_path))
+
+    print(f"{database_path}: {len(events) - len(jobs)} images up to date, rendering {len(jobs)}")
+    if jobs:
+        timings = []
+        elapsed = run_jobs(database_path, render_to_file, jobs, num_workers,
+                           lambda result: timings.append(result[2:]), view)
+        fetch_total = sum(fetch for fetch, _ in timings)
+        render_total = sum(render for _, render in timings)
+        print(f"Rendered {len(jobs)} events in {elapsed:.1f}s ({len(jobs) / elapsed:.1f} events/s)")
+        # Worker-side cost per event; each worker's first render also
+        # builds its display
+        print(f"  per event: {fetch_total / len(jobs) * 1000:.2f} ms fetching, "
+              f"{render_total / len(jobs) * 1000:.1f} ms rendering")
+    return events
+
+
+def render_pack(database_path, pack_path, run_number, num_workers, force, view="2d"):
+    # Missing images are rendered into a staging directory next to the pack
+    # (so an interrupted run picks up where it stopped), then streamed into
+    # the pack together with the still-valid images of the previous pack
+    stamp_path = pack_path + STAMP_SUFFIX
+    stamp = source_stamp(database_path, view)
+    existing = None
+    if not force and os.path.exists(pack_path) and read_stamp(stamp_path) == stamp:
+        existing = ImagePack(pack_path)
+    kept = set(int(event_number) for event_number in existing.event_numbers()) if existing else set()
+
+    staging_dir = pack_path + ".parts"
+    events = render_directory(database_path, staging_dir, run_number, num_workers, force, kept, view,
+                              stamp=stamp)
+    if kept.issuperset(events):
+        shutil.rmtree(staging_dir)
+        print(f"{pack_path} is up to date")
+        return
+
+    def staged_path(event_number):
+        return os.path.join(staging_dir, f"{run_number}_{event_number}.png")
+
+    def read_image(event_number):
+        if event_number in kept:
+            return existing.read_bytes(event_number)
+        with open(staged_path(event_number), "rb") as image_file:
+            return image_file.read()
+
+    sizes = []
+    for event_number in events:
+        if event_number in kept:
+            sizes.append((event_number, len(existing.read_bytes(event_number))))
+        else:
+            sizes.append((event_number, os.path.getsize(staged_path(event_number))))
+    write_pack(pack_path, sizes, read_image)
+    write_stamp(stamp_path, stamp)
+    shutil.rmtree(staging_dir)
+    print(f"Wrote {len(sizes)} images to {pack_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render event displays for every event in a database")
+    parser.add_argument("database")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--output-dir", help="write loose <run>_<event>.png files here")
+    output.add_argument("--pack", help="write a single .snpack file instead")
+    parser.add_argument("--run-number", default="1295", help="prefix for image file names")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--force", action="store_true", help="re-render images that are up to date")
+    parser.add_argument("--3d", dest="view", action="store_const", const="3d", default="2d",
+                        help="render 3D views offscreen instead of the 2D top view")
+    parser.add_argument("--events", type=int, nargs="+", help="only these events (with --output-dir)")
+    args = parser.parse_args()
+    if args.events and args.pack:
+        parser.error("--events only works with --output-dir")
+
+    if args.pack:
+        render_pack(args.database, args.pack, args.run_number, args.workers, args.force, args.view)
+    else:
+        render_directory(args.database, args.output_dir, args.run_number, args.workers, args.force,
+                         view=args.view, only=set(args.events) if args.events else None)
+
+
+if __name__ == "__main__":
+    main()
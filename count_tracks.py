@@ -1,10 +1,9 @@
-import sqlite3
+from db_pool import pool
 
 def main():
     db_path = "sq_SN_database_bg.db"
-    conn = sqlite3.connect(db_path)
-    
-    try:
+
+    with pool.connection(db_path) as conn, pool.timed("count tracks"):
         # Fetch unique event numbers and their counts
         cursor = conn.cursor()
         cursor.execute("""
@@ -21,9 +20,7 @@ def main():
         for event_number, num_tracks in results:
             print(f"{event_number} | {num_tracks // 2}")  # Assuming duplicates
 
-    finally:
-        # Close the connection
-        conn.close()
+    print(pool.report())
 
 if __name__ == "__main__":
     main()
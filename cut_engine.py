@@ -0,0 +1,117 @@
+import numpy as np
+
+from event_store import RUN_COLUMN, event_key
+from histogram_engine import MAX_CALO_HITS_CUT, MAX_ENERGY_CUT, MAX_TRACKS_CUT
+
+SIDE_EQUAL = 0
+SIDE_DIFFERENT = 1
+SIDE_UNKNOWN = 2
+
+
+class EventCuts:
+    # Per-event cut variables from the event summary as contiguous arrays,
+    # in summary (event number) order. Events are also sorted once by
+    # (side, num_tracks, num_calo_hits, total_energy), so every group of
+    # equal integer keys is a contiguous run sorted by energy and a cut is
+    # a binary search in each group it keeps, with no per-event compares.
+
+    def __init__(self, df):
+        # df is the compact event store (see event_store), indexed by event.
+        # For a store merged from several runs these are event keys, which
+        # keep events with the same number in different runs apart.
+        self.event_numbers = df.index.to_numpy(dtype=np.int64)
+        if RUN_COLUMN in df:
+            self.event_numbers = event_key(df[RUN_COLUMN].to_numpy(), self.event_numbers)
+        energy = df['total_energy'].to_numpy(dtype=np.float64)
+        tracks = df['num_tracks'].to_numpy(dtype=np.float64, na_value=np.nan)
+        calo_hits = df['num_calo_hits'].to_numpy(dtype=np.float64, na_value=np.nan)
+
+        s_status = df['s_status']
+        side = np.full(len(df), SIDE_UNKNOWN, dtype=np.int64)
+        side[(s_status == 'Equal').to_numpy()] = SIDE_EQUAL
+        side[(s_status == 'Different').to_numpy()] = SIDE_DIFFERENT
+
+        # Events missing any cut variable never pass a range cut, as with a
+        # pandas comparison against NaN
+        usable = np.flatnonzero(~(np.isnan(energy) | np.isnan(tracks) | np.isnan(calo_hits)))
+        side = side[usable]
+        tracks = tracks[usable].astype(np.int64)
+        calo_hits = calo_hits[usable].astype(np.int64)
+        energy = energy[usable]
+
+        order = np.lexsort((energy, calo_hits, tracks, side))
+        self.order = usable[order]
+        # Where each event sits in that order; unusable events point past
+        # the end, which select() never includes
+        self.sorted_position = np.full(len(df), len(order), dtype=np.intp)
+        self.sorted_position[self.order] = np.arange(len(order))
+
+        group_keys = np.stack([side[order], tracks[order], calo_hits[order]])
+        is_start = np.ones(len(order), dtype=bool)
+        is_start[1:] = np.any(group_keys[:, 1:] != group_keys[:, :-1], axis=0)
+        group_starts = np.flatnonzero(is_start)
+        self.group_side = group_keys[0, group_starts]
+        self.group_tracks = group_keys[1, group_starts]
+        self.group_calo_hits = group_keys[2, group_starts]
+
+        # Each event's group and energy rank as one sorted integer key, so
+        # a single searchsorted finds the energy range of every kept group
+        self.energy_values, energy_rank = np.unique(energy[order], return_inverse=True)
+        group = np.cumsum(is_start) - 1
+        self.sorted_keys = group * len(self.energy_values) + energy_rank.reshape(-1)
+
+    def __len__(self):
+        return len(self.event_numbers)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (
+            self.event_numbers, self.order, self.sorted_position, self.sorted_keys, self.energy_values,
+            self.group_side, self.group_tracks, self.group_calo_hits,
+        ))
+
+    def select(self, min_energy, max_energy, min_tracks, max_tracks,
+               min_calo_hits, max_calo_hits, same_side, different_side):
+        # A maximum at the largest cut means "and above", as in CutHistograms
+        if max_tracks >= MAX_TRACKS_CUT:
+            max_tracks = np.inf
+        if max_calo_hits >= MAX_CALO_HITS_CUT:
+            max_calo_hits = np.inf
+        if max_energy >= MAX_ENERGY_CUT:
+            max_energy = np.inf
+
+        keep = (
+            (self.group_tracks >= min_tracks) & (self.group_tracks <= max_tracks) &
+            (self.group_calo_hits >= min_calo_hits) & (self.group_calo_hits <= max_calo_hits)
+        )
+        if same_side:
+            keep &= self.group_side == SIDE_EQUAL
+        if different_side:
+            keep &= self.group_side == SIDE_DIFFERENT
+
+        low_rank = np.searchsorted(self.energy_values, min_energy, side="left")
+        high_rank = max(np.searchsorted(self.energy_values, max_energy, side="right"), low_rank)
+        group_base = np.flatnonzero(keep) * len(self.energy_values)
+        # Low and high ends of every kept group's energy range, interleaved
+        # so the searches are in order and the result is the run edges
+        bounds = np.searchsorted(self.sorted_keys,
+                                 np.column_stack([group_base + low_rank, group_base + high_rank]).reshape(-1))
+
+        lows, highs = bounds[0::2], bounds[1::2]
+        lengths = highs - lows
+        if lengths.sum() * 8 < len(self.order):
+            # A narrow cut: the few selected positions, sorted back into
+            # summary order
+            ends = np.cumsum(lengths)
+            positions = np.arange(ends[-1] if len(ends) else 0) + np.repeat(lows - ends + lengths, lengths)
+            return np.sort(self.order[positions])
+
+        # A wide one: the ranges as runs of a mask in sorted order, looked
+        # up by every event's sorted position to get back to summary order
+        counts = np.diff(bounds, prepend=0, append=len(self.order) + 1)
+        selected_sorted = np.repeat(np.arange(len(counts)) % 2 == 1, counts)
+        return np.flatnonzero(np.take(selected_sorted, self.sorted_position))
+
+    def selected_event_numbers(self, *cuts):
+        return self.event_numbers[self.select(*cuts)]
+
@@ -0,0 +1,183 @@
+import hashlib
+import os
+import shutil
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = os.path.join(os.getcwd(), "sn_cache")
+DEFAULT_MEMORY_BUDGET = 1024 * 1024 * 1024
+# Bumped whenever the cached frames change layout or dtypes
+CACHE_FORMAT = "v5"
+
+
+def database_fingerprint(database_path):
+    stat = os.stat(database_path)
+    key = f"{os.path.abspath(database_path)}:{stat.st_mtime_ns}:{stat.st_size}"
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def cache_prefix(database_path):
+    # Unique per database path, shared by every version of that database
+    name = os.path.splitext(os.path.basename(database_path))[0]
+    path_hash = hashlib.sha1(os.path.abspath(database_path).encode()).hexdigest()[:8]
+    return f"{name}-{path_hash}-"
+
+
+def cache_path(database_path):
+    return os.path.join(
+        CACHE_DIR, f"{cache_prefix(database_path)}{CACHE_FORMAT}-{database_fingerprint(database_path)}"
+    )
+
+
+def save_frame(frame, frame_dir):
+    # One .npy per column, the index saved as a column named in index.npy.
+    # Strings and categoricals are stored as integer codes plus their
+    # categories and nullable integers as values plus a missing mask, so
+    # nothing needs pickling and dtypes come back unchanged.
+    os.makedirs(frame_dir)
+    if frame.index.name is not None:
+        np.save(os.path.join(frame_dir, "index.npy"), np.asarray([frame.index.name], dtype=str))
+        frame = frame.reset_index()
+    columns = list(frame.columns)
+    for position, column in enumerate(columns):
+        values = frame[column]
+        if isinstance(values.dtype, pd.CategoricalDtype) or not (
+                pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values)):
+            categorical = pd.Categorical(values)
+            np.save(os.path.join(frame_dir, f"{position}.codes.npy"), categorical.codes)
+            np.save(
+                os.path.join(frame_dir, f"{position}.categories.npy"),
+                np.asarray(categorical.categories, dtype=str),
+            )
+        elif isinstance(values.dtype, pd.api.extensions.ExtensionDtype):
+            np.save(os.path.join(frame_dir, f"{position}.npy"),
+                    values.to_numpy(dtype=values.dtype.numpy_dtype, na_value=0))
+            np.save(os.path.join(frame_dir, f"{position}.mask.npy"), values.isna().to_numpy())
+        else:
+            np.save(os.path.join(frame_dir, f"{position}.npy"), values.to_numpy())
+    np.save(os.path.join(frame_dir, "columns.npy"), np.asarray(columns, dtype=str))
+
+
+def load_frame(frame_dir):
+    columns = np.load(os.path.join(frame_dir, "columns.npy"))
+    data = {}
+    for position, column in enumerate(columns):
+        values_path = os.path.join(frame_dir, f"{position}.npy")
+        mask_path = os.path.join(frame_dir, f"{position}.mask.npy")
+        if os.path.exists(mask_path):
+            values = np.load(values_path)
+            mask = np.load(mask_path)
+            if values.dtype.kind == "b":
+                data[str(column)] = pd.arrays.BooleanArray(values, mask)
+            elif values.dtype.kind == "f":
+                data[str(column)] = pd.arrays.FloatingArray(values, mask)
+            else:
+                data[str(column)] = pd.arrays.IntegerArray(values, mask)
+        elif os.path.exists(values_path):
+            data[str(column)] = np.load(values_path)
+        else:
+            codes = np.load(os.path.join(frame_dir, f"{position}.codes.npy"))
+            categories = np.load(os.path.join(frame_dir, f"{position}.categories.npy"))
+            data[str(column)] = pd.Categorical.from_codes(codes, categories.astype(object))
+    frame = pd.DataFrame(data)
+
+    index_path = os.path.join(frame_dir, "index.npy")
+    if os.path.exists(index_path):
+        frame = frame.set_index(str(np.load(index_path)[0]))
+    return frame
+
+
+def load_cached_frames(database_path, names):
+    if not os.path.exists(database_path):
+        return None
+    path = cache_path(database_path)
+    if not all(os.path.isdir(os.path.join(path, name)) for name in names):
+        return None
+    return {name: load_frame(os.path.join(path, name)) for name in names}
+
+
+def save_cached_frames(database_path, frames):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = cache_path(database_path)
+
+    # Drop entries for older versions of the same database
+    prefix = cache_prefix(database_path)
+    for entry in os.listdir(CACHE_DIR):
+        if entry.startswith(prefix) and os.path.join(CACHE_DIR, entry) != path:
+            shutil.rmtree(os.path.join(CACHE_DIR, entry), ignore_errors=True)
+
+    # Write into a scratch directory and rename it so a half-written
+    # cache is never picked up
+    scratch_path = f"{path}.tmp{os.getpid()}"
+    shutil.rmtree(scratch_path, ignore_errors=True)
+    for name, frame in frames.items():
+        save_frame(frame, os.path.join(scratch_path, name))
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(scratch_path, path)
+
+
+def frames_memory(frames):
+    total = 0
+    for value in frames.values():
+        if hasattr(value, "memory_usage"):
+            total += value.memory_usage(deep=True).sum()
+        else:
+            total += getattr(value, "nbytes", 0)
+    return int(total)
+
+
+class DatasetLRU:
+    # Loaded datasets kept in memory for the session, least recently used
+    # first out once the total size goes over the budget
+
+    def __init__(self, max_bytes=DEFAULT_MEMORY_BUDGET, fingerprint=database_fingerprint):
+        # fingerprint(database_path) must change whenever the data does;
+        # run sets pass run_merge.dataset_fingerprint
+        self.max_bytes = max_bytes
+        self.fingerprint = fingerprint
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def current_fingerprint(self, database_path):
+        try:
+            return self.fingerprint(database_path)
+        except OSError:
+            return None
+
+    def get(self, database_path):
+        entry = self.entries.get(database_path)
+        if entry is not None:
+            fingerprint, frames, _ = entry
+            if fingerprint is not None and fingerprint == self.current_fingerprint(database_path):
+                self.entries.move_to_end(database_path)
+                self.hits += 1
+                return frames
+            del self.entries[database_path]
+        self.misses += 1
+        return None
+
+    def put(self, database_path, frames):
+        self.entries.pop(database_path, None)
+        self.entries[database_path] = (
+            self.current_fingerprint(database_path), frames, frames_memory(frames)
+        )
+        # Always keep the dataset just loaded, even if it alone is over budget
+        while len(self.entries) > 1 and self.total_bytes() > self.max_bytes:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def total_bytes(self):
+        return sum(size for _, _, size in self.entries.values())
+
+    def report(self):
+        lines = [
+            f"Dataset cache: {self.hits} hits, {self.misses} misses, {self.evictions} evictions, "
+            f"{self.total_bytes() / 2**20:.1f} / {self.max_bytes / 2**20:.0f} MB"
+        ]
+        for database_path, (_, _, size) in self.entries.items():
+            lines.append(f"  {database_path}: {size / 2**20:.1f} MB")
+        return "\n".join(lines)
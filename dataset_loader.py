@@ -0,0 +1,111 @@
+import sqlite3
+
+from dataset_cache import load_cached_frames, save_cached_frames
+from db_indexes import ensure_indexes, missing_indexes
+from db_pool import pool
+from event_store import compact_events, footprint_report
+from event_stream import load_event_store
+from event_summary import (read_summary, source_fingerprint, stored_fingerprint, summary_supported,
+                           write_summary)
+
+FRAME_NAMES = ["df", "calo_energy"]
+
+
+class LoadCancelled(Exception):
+    pass
+
+
+def prepare_indexes(database_path, progress=None, is_cancelled=None):
+    # The one step that writes. Indexes are created once per database on a
+    # short-lived writable connection; everything else reads through the
+    # shared read-only pool.
+    with pool.connection(database_path) as conn:
+        if not missing_indexes(conn):
+            return
+
+    def index_progress(step, total, index_name):
+        if progress is not None:
+            progress(step, total, index_name and f"creating {index_name}")
+
+    conn = sqlite3.connect(database_path)
+    if is_cancelled is not None:
+        conn.set_progress_handler(lambda: 1 if is_cancelled() else 0, 10000)
+    try:
+        with pool.timed("create indexes"):
+            created = ensure_indexes(conn, index_progress)
+        print(f"Created indexes {', '.join(created)} on {database_path}")
+    except sqlite3.OperationalError as e:
+        if is_cancelled is not None and is_cancelled():
+            raise
+        # e.g. a run on read-only storage; it still loads, just slower
+        print(f"Could not create indexes on {database_path} ({e}), reading without them")
+    finally:
+        conn.close()
+
+
+def query_frames(conn):
+    # The summary stored in the database when it is still current, else
+    # one event-ordered pass over tracks and calo_hits that builds the
+    # per-event summary and the calo energy counts, so memory does not grow
+    # with the number of hits in the database. Also returns the fingerprint
+    # to store a freshly built summary under, None if it was read back or
+    # the database cannot keep one (see event_summary.summary_supported).
+    fingerprint = source_fingerprint(conn) if summary_supported(conn) else None
+    if fingerprint is not None and stored_fingerprint(conn) == fingerprint:
+        df, calo_energy = read_summary(conn)
+        df = compact_events(df)
+        fingerprint = None
+    else:
+        df, calo_energy = load_event_store(conn)
+    return {"df": df, "calo_energy": calo_energy}, fingerprint
+
+
+def store_summary(database_path, frames, fingerprint, is_cancelled=None):
+    # Written like the indexes, on a short-lived writable connection, so
+    # a cold load that misses the disk cache reads it back instead of
+    # scanning every hit again
+    conn = sqlite3.connect(database_path)
+    if is_cancelled is not None:
+        conn.set_progress_handler(lambda: 1 if is_cancelled() else 0, 10000)
+    try:
+        with pool.timed("store event summary"):
+            if not write_summary(conn, frames["df"], frames["calo_energy"], fingerprint):
+                print(f"{database_path} changed while loading, not storing its summary")
+    except sqlite3.OperationalError as e:
+        if is_cancelled is not None and is_cancelled():
+            raise
+        print(f"Could not store the event summary in {database_path} ({e})")
+    finally:
+        conn.close()
+
+
+def load_frames(database_path, progress=None, is_cancelled=None):
+    # Safe to call from a worker thread: it checks out its own connection
+    # and checks is_cancelled() between steps and while SQLite is running
+    frames = load_cached_frames(database_path, FRAME_NAMES)
+    if frames is not None:
+        print(f"Loaded {database_path} from cache")
+        print(footprint_report(frames))
+        return frames
+
+    try:
+        prepare_indexes(database_path, progress, is_cancelled)
+        with pool.connection(database_path) as conn, pool.timed("load event store"):
+            if is_cancelled is not None:
+                conn.set_progress_handler(lambda: 1 if is_cancelled() else 0, 10000)
+            frames, fingerprint = query_frames(conn)
+        if fingerprint is not None:
+            store_summary(database_path, frames, fingerprint, is_cancelled)
+    except sqlite3.OperationalError:
+        if is_cancelled is not None and is_cancelled():
+            raise LoadCancelled(database_path)
+        raise
+
+    if is_cancelled is not None and is_cancelled():
+        raise LoadCancelled(database_path)
+
+    # Saved after the index and summary writes so the key matches the
+    # database as left by them
+    save_cached_frames(database_path, frames)
+    print(footprint_report(frames))
+    return frames
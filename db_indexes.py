@@ -0,0 +1,76 @@
+import sqlite3
+import sys
+
+# Leading event_number column serves the GROUP BYs and per-event lookups;
+# the trailing columns make the indexes covering for the summary queries.
+COVERING_INDEXES = {
+    "idx_tracks_event_number": ("tracks", ["event_number", "S"]),
+    "idx_calo_hits_event_number": ("calo_hits", ["event_number", "energy", "calo_hit_time"]),
+}
+
+
+def table_columns(conn, table):
+    cursor = conn.cursor()
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+
+def missing_indexes(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+    existing = {row[0] for row in cursor.fetchall()}
+
+    missing = []
+    for index_name, (table, columns) in COVERING_INDEXES.items():
+        if index_name in existing:
+            continue
+        # Older schemas lack some of the covering columns, so only index
+        # the ones that are actually there
+        available = table_columns(conn, table)
+        if "event_number" not in available:
+            continue
+        columns = [column for column in columns if column in available]
+        missing.append((index_name, table, columns))
+    return missing
+
+
+def ensure_indexes(conn, progress=None):
+    missing = missing_indexes(conn)
+    for step, (index_name, table, columns) in enumerate(missing):
+        if progress is not None:
+            progress(step, len(missing), index_name)
+        with conn:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table}({', '.join(columns)})")
+    if missing:
+        with conn:
+            conn.execute("ANALYZE")
+        if progress is not None:
+            progress(len(missing), len(missing), None)
+    return [index_name for index_name, _, _ in missing]
+
+
+def print_progress(step, total, index_name):
+    if index_name is None:
+        print(f"  [{step}/{total}] done")
+    else:
+        print(f"  [{step + 1}/{total}] creating {index_name}")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python db_indexes.py <database> [<database> ...]")
+        return
+
+    for db_path in sys.argv[1:]:
+        conn = sqlite3.connect(db_path)
+        try:
+            print(f"{db_path}:")
+            created = ensure_indexes(conn, print_progress)
+            if not created:
+                print("  all indexes present")
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from dataset_cache import database_fingerprint
+
+MMAP_SIZE = 256 * 1024 * 1024
+# Negative cache_size is in KiB
+CACHE_SIZE_KIB = 64 * 1024
+
+
+def read_only_uri(database_path, immutable=False):
+    uri = f"file:{quote(os.path.abspath(database_path))}?mode=ro"
+    if immutable:
+        # Skips locking and change detection entirely; only for files
+        # nothing writes to while they are open (finished runs, batch jobs)
+        uri += "&immutable=1"
+    return uri
+
+
+def require_database(database_path):
+    if not os.path.exists(database_path):
+        # mode=ro would fail anyway, but without saying which file
+        raise sqlite3.OperationalError(f"unable to open database file: {database_path}")
+
+
+def connect_read_only(database_path, immutable=False, check_same_thread=True):
+    require_database(database_path)
+    conn = sqlite3.connect(read_only_uri(database_path, immutable), uri=True,
+                           check_same_thread=check_same_thread)
+    # Pages come straight from the memory map, which every connection to
+    # the file (in any thread or process) shares through the OS page cache
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+class ConnectionPool:
+    # Idle read-only connections per database, handed to whichever thread
+    # asks next. A connection is only ever used by one thread at a time.
+    # Connections are keyed by the database fingerprint, so a rewritten
+    # database gets fresh ones.
+
+    def __init__(self, max_idle=4, immutable=False):
+        self.max_idle = max_idle
+        self.immutable = immutable
+        self.lock = threading.Lock()
+        self.idle = {}
+        self.timings = {}
+
+    def pool_key(self, database_path):
+        require_database(database_path)
+        return os.path.abspath(database_path), database_fingerprint(database_path)
+
+    @contextmanager
+    def connection(self, database_path):
+        key = self.pool_key(database_path)
+        conn = None
+        with self.lock:
+            for stale_key in [other for other in self.idle if other[0] == key[0] and other != key]:
+                for stale in self.idle.pop(stale_key):
+                    stale.close()
+            if self.idle.get(key):
+                conn = self.idle[key].pop()
+        if conn is None:
+            conn = connect_read_only(database_path, self.immutable, check_same_thread=False)
+
+        try:
+            yield conn
+        finally:
+            conn.set_progress_handler(None, 0)
+            with self.lock:
+                idle = self.idle.setdefault(key, [])
+                if len(idle) < self.max_idle:
+                    idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    @contextmanager
+    def timed(self, label):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                count, total = self.timings.get(label, (0, 0.0))
+                self.timings[label] = (count + 1, total + elapsed)
+
+    def fetchall(self, database_path, query, params=(), label=None):
+        with self.connection(database_path) as conn, self.timed(label or query.strip().split("\n")[0]):
+            return conn.execute(query, params).fetchall()
+
+    def report(self):
+        with self.lock:
+            timings = sorted(self.timings.items(), key=lambda item: -item[1][1])
+            num_idle = sum(len(idle) for idle in self.idle.values())
+        lines = [f"Connection pool: {num_idle} idle connections"]
+        for label, (count, total) in timings:
+            lines.append(f"  {label}: {count} calls, {total * 1000:.1f} ms total, "
+                         f"{total / count * 1000:.2f} ms each")
+        return "\n".join(lines)
+
+    def close_all(self):
+        with self.lock:
+            for idle in self.idle.values():
+                for conn in idle:
+                    conn.close()
+            self.idle.clear()
+
+
+# Shared by everything in the process that reads event databases
+pool = ConnectionPool()
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: python db_pool.py <database> <query> [<repeats>]")
+        return
+
+    database_path, query = sys.argv[1], sys.argv[2]
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    for _ in range(repeats):
+        rows = pool.fetchall(database_path, query, label="query")
+    print(f"{len(rows)} rows")
+    print(pool.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+import io
+import os
+import sys
+import threading
+
+import numpy as np
+import vtk
+from PIL import Image
+from vtk.util.numpy_support import numpy_to_vtk, vtk_to_numpy
+
+from db_pool import pool
+from event_renderer import (CALO_COLUMN_WIDTH, CALO_WALL_DEPTH, CALO_WALL_X, MAIN_WALL_TYPE, NUM_CALO_COLUMNS,
+                            NUM_CALO_ROWS, OMS_PER_SIDE, TRACKER_CELL_X, TRACKER_CELL_Y, TRACKER_GRID,
+                            calo_column_y, fetch_event, side_sign)
+
+# Detector coordinates in mm as in event_renderer: x across the foil, y
+# along it, z up. The scene draws z as VTK's y so the wires stand upright.
+CALO_ROW_HEIGHT = 259.0
+TRACKER_HEIGHT = NUM_CALO_ROWS * CALO_ROW_HEIGHT
+FOIL_THICKNESS = 10.0
+FOIL_HALF_LENGTH = NUM_CALO_COLUMNS * CALO_COLUMN_WIDTH / 2
+WIRE_RADIUS = 4.0
+FLOOR_Z = -TRACKER_HEIGHT / 2 - 100.0
+VERTEX_RADIUS = 25.0
+
+# RGBA, 0-255
+CELL_COLOUR = (0, 255, 0, 20)  # Green, mostly transparent
+HIT_CELL_COLOUR = (255, 255, 0, 255)  # Yellow
+OM_COLOUR = (200, 200, 200, 30)
+HIT_OM_COLOUR = (0, 255, 0, 255)  # Lime, as in the 2D display
+
+OFFSCREEN_SIZE = (1200, 900)
+
+
+def scene_points(points):
+    # Detector (x, y, z) to scene (x, z, y)
+    return np.asarray(points, dtype=np.float64).reshape(-1, 3)[:, [0, 2, 1]]
+
+
+def calo_row_z(row):
+    return (row - NUM_CALO_ROWS / 2 + 0.5) * CALO_ROW_HEIGHT
+
+
+def om_centres():
+    # Front face centre of every main wall OM, in om_number order
+    side, om_in_side = np.divmod(np.arange(2 * OMS_PER_SIDE), OMS_PER_SIDE)
+    column, row = np.divmod(om_in_side, NUM_CALO_ROWS)
+    x = np.where(side == 0, 1.0, -1.0) * CALO_WALL_X
+    return np.column_stack([x, calo_column_y(column), calo_row_z(row)])
+
+
+OM_CENTRES = om_centres()
+
+
+def om_index(side, column, row):
+    return (side * NUM_CALO_COLUMNS + column) * NUM_CALO_ROWS + row
+
+
+def event_geometry(tracks, calo_hits):
+    # Vertices, track end points and hit OMs of one event, from the rows
+    # of event_renderer.fetch_event
+    vertices, starts, ends = [], [], []
+    hit_oms = set()
+    for x, y, z, side, _, column, row, om_type in tracks:
+        if y is None or y == -1.0:
+            continue
+        vertices.append((x, y, z))
+        if side is None or side < 0 or column is None or column < 0 or om_type != MAIN_WALL_TYPE:
+            continue
+        # Tracks end on the front face of their OM; at the vertex height
+        # when the row is unknown
+        end_z = calo_row_z(row) if row is not None and row >= 0 else z
+        starts.append((x, y, z))
+        ends.append((side_sign(side) * CALO_WALL_X, calo_column_y(column), end_z))
+        if row is not None and row >= 0:
+            hit_oms.add(om_index(int(side), int(column), int(row)))
+    for _, _, om_number in calo_hits:
+        if om_number is not None and 0 <= om_number < 2 * OMS_PER_SIDE:
+            hit_oms.add(int(om_number))
+    return (np.array(vertices, dtype=np.float64).reshape(-1, 3), np.array(starts, dtype=np.float64).reshape(-1, 3),
+            np.array(ends, dtype=np.float64).reshape(-1, 3), sorted(hit_oms))
+
+
+def wire_spans(starts, ends):
+    # The parts of the segments within the wires' height; segments wholly
+    # above or below it are dropped
+    direction = ends - starts
+    low, high = -TRACKER_HEIGHT / 2, TRACKER_HEIGHT / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t0 = (low - starts[:, 2]) / direction[:, 2]
+        t1 = (high - starts[:, 2]) / direction[:, 2]
+    level = direction[:, 2] == 0
+    inside = (starts[:, 2] >= low) & (starts[:, 2] <= high)
+    t_low = np.where(level, 0.0, np.maximum(np.minimum(t0, t1), 0.0))
+    t_high = np.where(level, 1.0, np.minimum(np.maximum(t0, t1), 1.0))
+    kept = np.flatnonzero(np.where(level, inside, t_low <= t_high))
+    return (starts[kept] + t_low[kept, None] * direction[kept],
+            starts[kept] + t_high[kept, None] * direction[kept])
+
+
+def glyph_colours(polydata, colour):
+    # Per-point RGBA array shared with numpy, so it can be rewritten in
+    # place and marked modified
+    colours = np.tile(np.array(colour, dtype=np.uint8), (polydata.GetNumberOfPoints(), 1))
+    array = numpy_to_vtk(colours, deep=False)
+    array.SetName("colours")
+    polydata.GetPointData().AddArray(array)
+    return colours, array
+
+
+def glyph_mapper(points, source, colour_array=None, scale_array=None, masked=False):
+    mapper = vtk.vtkGlyph3DMapper()
+    mapper.SetInputData(points)
+    mapper.SetSourceConnection(source.GetOutputPort())
+    mapper.OrientOff()
+    if masked:
+        mapper.MaskingOn()
+        mapper.SetMaskArray("mask")
+    if scale_array is None:
+        mapper.ScalingOff()
+    else:
+        mapper.SetScaleArray(scale_array)
+        mapper.SetScaleModeToScaleByMagnitude()
+    if colour_array is None:
+        mapper.ScalarVisibilityOff()
+    else:
+        mapper.SetScalarModeToUsePointFieldData()
+        mapper.SelectColorArray(colour_array)
+        mapper.SetColorModeToDirectScalars()
+    return mapper
+
+
+def point_cloud(points):
+    polydata = vtk.vtkPolyData()
+    vtk_points = vtk.vtkPoints()
+    vtk_points.SetData(numpy_to_vtk(scene_points(points), deep=True))
+    polydata.SetPoints(vtk_points)
+    return polydata
+
+
+class OverlayPoints:
+    # Points of one event overlay in a buffer VTK shares with numpy, so an
+    # event or animation step is written in place. The buffer only grows;
+    # points past the current count sit at the origin and are masked out
+    # of glyphing.
+
+    def __init__(self, scale_array=None, capacity=16):
+        self.polydata = vtk.vtkPolyData()
+        self.scale_array = scale_array
+        self.count = 0
+        # Glyph masks must be bit arrays, which numpy cannot share, so only
+        # the entries that change are set
+        self.mask = vtk.vtkBitArray()
+        self.mask.SetName("mask")
+        self.polydata.GetPointData().AddArray(self.mask)
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        self.points = np.zeros((capacity, 3))
+        vtk_points = vtk.vtkPoints()
+        vtk_points.SetData(numpy_to_vtk(self.points, deep=False))
+        self.polydata.SetPoints(vtk_points)
+        self.mask.SetNumberOfTuples(capacity)
+        self.mask.Fill(0)
+        self.count = 0
+        if self.scale_array is not None:
+            self.scales = np.zeros(capacity)
+            self.vtk_scales = numpy_to_vtk(self.scales, deep=False)
+            self.vtk_scales.SetName(self.scale_array)
+            self.polydata.GetPointData().AddArray(self.vtk_scales)
+
+    def set(self, points, scales=None):
+        # Returns whether the number of points changed
+        points = scene_points(points)
+        count = len(points)
+        if count > len(self.points):
+            self.allocate(max(count, 2 * len(self.points)))
+        self.points[:count] = points
+        self.points[count:self.count] = 0
+        for index in range(min(count, self.count), max(count, self.count)):
+            self.mask.SetValue(index, index < count)
+        changed = count != self.count
+        self.count = count
+
+        self.polydata.GetPoints().GetData().Modified()
+        self.polydata.GetPoints().Modified()
+        self.mask.Modified()
+        if scales is not None:
+            self.scales[:count] = scales
+            self.vtk_scales.Modified()
+        return changed
+
+
+def actor_for(mapper, colour=None, opacity=1.0):
+    actor = vtk.vtkActor()
+    actor.SetMapper(mapper)
+    if colour is not None:
+        actor.GetProperty().SetColor(*colour)
+    actor.GetProperty().SetOpacity(opacity)
+    return actor
+
+
+class DetectorScene:
+    # The detector is built once per renderer. An event only rewrites the
+    # colour arrays of the tracker cells and OMs and the points of the
+    # track, vertex and hit disk overlays, so showing one costs a render.
+    # Needs no Qt, so it also renders in offscreen windows.
+
+    def __init__(self, renderer):
+        self.renderer = renderer
+        self.renderer.SetBackground(1, 1, 1)  # White background
+
+        foil = vtk.vtkCubeSource()
+        foil.SetBounds(-FOIL_THICKNESS / 2, FOIL_THICKNESS / 2, -TRACKER_HEIGHT / 2, TRACKER_HEIGHT / 2,
+                       -FOIL_HALF_LENGTH, FOIL_HALF_LENGTH)
+        self.foil_actor = self.add_source(foil, (1, 1, 0), 0.4)  # Yellow
+
+        floor = vtk.vtkCubeSource()
+        floor.SetBounds(-CALO_WALL_X - CALO_WALL_DEPTH, CALO_WALL_X + CALO_WALL_DEPTH, FLOOR_Z, FLOOR_Z,
+                        -FOIL_HALF_LENGTH, FOIL_HALF_LENGTH)
+        self.floor_actor = self.add_source(floor, (0.5, 0.5, 0.5), 0.3)
+
+        # One cylinder instanced at every wire
+        wire = vtk.vtkCylinderSource()
+        wire.SetRadius(WIRE_RADIUS)
+        wire.SetHeight(TRACKER_HEIGHT)
+        wire.SetResolution(12)
+        cells = point_cloud(np.column_stack([TRACKER_CELL_X, TRACKER_CELL_Y, np.zeros(len(TRACKER_CELL_X))]))
+        self.cell_colours, self.cell_colour_array = glyph_colours(cells, CELL_COLOUR)
+        self.tracker_actor = actor_for(glyph_mapper(cells, wire, "colours"))
+        self.renderer.AddActor(self.tracker_actor)
+
+        # One box instanced at every main wall OM, set back from its front face
+        om_box = vtk.vtkCubeSource()
+        om_box.SetXLength(CALO_WALL_DEPTH)
+        om_box.SetYLength(CALO_ROW_HEIGHT * 0.95)
+        om_box.SetZLength(CALO_COLUMN_WIDTH * 0.95)
+        om_points = OM_CENTRES + np.column_stack([np.sign(OM_CENTRES[:, 0]) * CALO_WALL_DEPTH / 2,
+                                                  np.zeros(len(OM_CENTRES)), np.zeros(len(OM_CENTRES))])
+        oms = point_cloud(om_points)
+        self.om_colours, self.om_colour_array = glyph_colours(oms, OM_COLOUR)
+        self.calo_actor = actor_for(glyph_mapper(oms, om_box, "colours"))
+        self.renderer.AddActor(self.calo_actor)
+
+        # Event overlays: their points are rewritten per event, their
+        # pipelines and actors never are
+        disk = vtk.vtkDiskSource()
+        disk.SetInnerRadius(0.0)
+        disk.SetOuterRadius(1.0)
+        disk.SetCircumferentialResolution(24)
+        disk.SetNormal(0, 1, 0)  # Across the wires
+        self.hit_disks = OverlayPoints("hit_radius")
+        self.hit_disk_actor = actor_for(glyph_mapper(self.hit_disks.polydata, disk, scale_array="hit_radius",
+                                                     masked=True), (1, 0.6, 0))  # Orange
+        self.renderer.AddActor(self.hit_disk_actor)
+
+        sphere = vtk.vtkSphereSource()
+        sphere.SetRadius(VERTEX_RADIUS)
+        self.vertices = OverlayPoints()
+        self.vertex_actor = actor_for(glyph_mapper(self.vertices.polydata, sphere, masked=True), (1, 0, 0))  # Red
+        self.renderer.AddActor(self.vertex_actor)
+
+        # Start points then end points, one line per track
+        self.track_lines = OverlayPoints()
+        track_mapper = vtk.vtkPolyDataMapper()
+        track_mapper.SetInputData(self.track_lines.polydata)
+        self.track_actor = actor_for(track_mapper, (1, 0, 0))  # Red
+        self.track_actor.GetProperty().SetLineWidth(2)
+        self.renderer.AddActor(self.track_actor)
+
+        self.reset_camera()
+
+    def add_source(self, source, colour, opacity=1.0):
+        mapper = vtk.vtkPolyDataMapper()
+        mapper.SetInputConnection(source.GetOutputPort())
+        actor = actor_for(mapper, colour, opacity)
+        self.renderer.AddActor(actor)
+        return actor
+
+    def reset_camera(self):
+        camera = self.renderer.GetActiveCamera()
+        # From above and in front of the side 1 wall
+        camera.SetFocalPoint(0, 0, 0)
+        camera.SetPosition(-5000, 3500, -2500)
+        camera.SetViewUp(0, 1, 0)
+        self.renderer.ResetCamera()
+
+    def show_tracks(self, starts, ends):
+        # Straight tracks between detector points, and the tracker cells
+        # they cross. Wires are vertical, so a cell is crossed when the
+        # track's top view passes within half a cell of the wire.
+        starts = np.asarray(starts, dtype=np.float64).reshape(-1, 3)
+        ends = np.asarray(ends, dtype=np.float64).reshape(-1, 3)
+        if self.track_lines.set(np.concatenate([starts, ends])):
+            lines = vtk.vtkCellArray()
+            for track in range(len(starts)):
+                lines.InsertNextCell(2, (track, len(starts) + track))
+            self.track_lines.polydata.SetLines(lines)
+
+        # Only the part of each track within the wires' height counts
+        starts, ends = wire_spans(starts, ends)
+        track, cell, distance = TRACKER_GRID.crossings(starts[:, [1, 0]], ends[:, [1, 0]])
+        # Disks sit at the height the track passes the wire
+        wires = np.column_stack([TRACKER_CELL_X[cell], TRACKER_CELL_Y[cell]])
+        direction = ends[track] - starts[track]
+        t = np.einsum("ij,ij->i", wires - starts[track, :2], direction[:, :2]) \
+            / np.maximum(np.einsum("ij,ij->i", direction[:, :2], direction[:, :2]), 1e-12)
+        disk_points = np.column_stack([wires, starts[track, 2] + np.clip(t, 0.0, 1.0) * direction[:, 2]])
+        self.hit_disks.set(disk_points, distance)
+
+        self.cell_colours[:] = CELL_COLOUR
+        self.cell_colours[cell] = HIT_CELL_COLOUR
+        self.cell_colour_array.Modified()
+        return cell
+
+    def show_vertices(self, vertices):
+        self.vertices.set(vertices)
+
+    def show_oms(self, hit_oms):
+        self.om_colours[:] = OM_COLOUR
+        self.om_colours[list(hit_oms)] = HIT_OM_COLOUR
+        self.om_colour_array.Modified()
+
+    def show_event(self, tracks, calo_hits):
+        vertices, starts, ends, hit_oms = event_geometry(tracks, calo_hits)
+        self.show_vertices(vertices)
+        self.show_tracks(starts, ends)
+        self.show_oms(hit_oms)
+
+    def clear_event(self):
+        self.show_event([], [])
+
+
+def offscreen_render_window():
+    # vtkRenderWindow() tries an X window first; with no display it logs
+    # "bad X server connection" and only then falls back to EGL. Headless
+    # Linux machines (batch workers, compute nodes) ask for EGL directly
+    # and only use the default when this VTK has no EGL or no device.
+    if sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+        egl_window = getattr(vtk, "vtkEGLRenderWindow", None)
+        if egl_window is not None:
+            render_window = egl_window()
+            render_window.SetOffScreenRendering(1)
+            if render_window.SupportsOpenGL():
+                return render_window
+    render_window = vtk.vtkRenderWindow()
+    render_window.SetOffScreenRendering(1)
+    return render_window
+
+
+class OffscreenEventDisplay:
+    # A DetectorScene in an offscreen render window, so event displays
+    # render to PNG with no display or Qt. Not thread-safe: use one
+    # instance per thread or process, like event_renderer.EventDisplay.
+
+    def __init__(self, size=OFFSCREEN_SIZE):
+        self.render_window = offscreen_render_window()
+        self.render_window.SetSize(*size)
+        self.renderer = vtk.vtkRenderer()
+        self.render_window.AddRenderer(self.renderer)
+        self.scene = DetectorScene(self.renderer)
+
+        self.title = vtk.vtkTextActor()
+        self.title.GetTextProperty().SetFontSize(24)
+        self.title.GetTextProperty().SetColor(0, 0, 0)
+        self.title.GetTextProperty().SetJustificationToCentered()
+        self.title.GetPositionCoordinate().SetCoordinateSystemToNormalizedViewport()
+        self.title.GetPositionCoordinate().SetValue(0.5, 0.93)
+        self.renderer.AddViewProp(self.title)
+
+        self.window_image = vtk.vtkWindowToImageFilter()
+        self.window_image.SetInput(self.render_window)
+        self.window_image.ReadFrontBufferOff()
+
+    def render_png(self, event_number, tracks, calo_hits):
+        self.title.SetInput(f"Event {int(event_number)}")
+        self.scene.show_event(tracks, calo_hits)
+        self.render_window.Render()
+        self.window_image.Modified()
+        self.window_image.Update()
+
+        image = self.window_image.GetOutput()
+        width, height, _ = image.GetDimensions()
+        # VTK images start at the bottom row
+        pixels = vtk_to_numpy(image.GetPointData().GetScalars()).reshape(height, width, -1)[::-1]
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format="png")
+        return buffer.getvalue()
+
+
+display_per_thread = threading.local()
+
+
+def render_event_png_3d(event_number, tracks, calo_hits):
+    if not hasattr(display_per_thread, "display"):
+        display_per_thread.display = OffscreenEventDisplay()
+    return display_per_thread.display.render_png(event_number, tracks, calo_hits)
+
+
+def main():
+    if len(sys.argv) < 4:
+        print("Usage: python detector_scene.py <database> <event_number> <output.png>")
+        return
+
+    database_path, event_number, output_path = sys.argv[1], int(sys.argv[2]), sys.argv[3]
+    with pool.connection(database_path) as conn:
+        tracks, calo_hits = fetch_event(conn, event_number)
+    with open(output_path, "wb") as output_file:
+        output_file.write(render_event_png_3d(event_number, tracks, calo_hits))
+    print(f"Rendered event {event_number} to {output_path} "
+          f"with {display_per_thread.display.render_window.GetClassName()}")
+
+
+if __name__ == "__main__":
+    main()
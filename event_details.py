@@ -0,0 +1,81 @@
+from PyQt5.QtWidgets import (QAbstractItemView, QHBoxLayout, QHeaderView, QLabel, QTableWidget,
+                             QTableWidgetItem, QVBoxLayout, QWidget)
+
+from prefetch_cache import PrefetchCache
+
+# Column order of event_renderer.TRACK_QUERY and CALO_QUERY
+TRACK_HEADERS = ["x (mm)", "y (mm)", "z (mm)", "S", "W", "C", "R", "Type"]
+CALO_HEADERS = ["Energy (MeV)", "Time (ns)", "OM"]
+
+
+def fetch_details(source, event_number):
+    # source is a RenderedImageSource or RunImageSource; None for an event
+    # with no rows at all
+    tracks, calo_hits = source.fetch_event_rows(event_number)
+    if not tracks and not calo_hits:
+        return None
+    return tracks, calo_hits
+
+
+class EventDetailCache(PrefetchCache):
+    # (tracks, calo_hits) rows per event. Each lookup is two indexed
+    # queries on a pooled connection, whose statement cache keeps them
+    # prepared between events.
+
+    def __init__(self, max_entries=256, parent=None):
+        super().__init__(max_entries, 1, parent)
+
+    def load(self, source, event_number):
+        return fetch_details(source, event_number)
+
+
+def detail_table(headers):
+    table = QTableWidget(0, len(headers))
+    table.setHorizontalHeaderLabels(headers)
+    table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+    table.verticalHeader().setVisible(False)
+    table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+    return table
+
+
+def format_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+class EventDetailPanel(QWidget):
+    # Tracks and calo hits of one event in two tables side by side
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.tracks_label = QLabel("Tracks")
+        self.tracks_table = detail_table(TRACK_HEADERS)
+        self.calo_label = QLabel("Calo Hits")
+        self.calo_table = detail_table(CALO_HEADERS)
+        for label, table, stretch in ((self.tracks_label, self.tracks_table, 2),
+                                      (self.calo_label, self.calo_table, 1)):
+            column = QVBoxLayout()
+            column.addWidget(label)
+            column.addWidget(table)
+            layout.addLayout(column, stretch)
+        self.setFixedHeight(170)
+
+    def fill(self, table, rows):
+        table.setUpdatesEnabled(False)
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                table.setItem(row, column, QTableWidgetItem(format_value(value)))
+        table.setUpdatesEnabled(True)
+
+    def show_details(self, details):
+        tracks, calo_hits = details if details is not None else ([], [])
+        self.tracks_label.setText(f"Tracks ({len(tracks)})")
+        self.calo_label.setText(f"Calo Hits ({len(calo_hits)})")
+        self.fill(self.tracks_table, tracks)
+        self.fill(self.calo_table, calo_hits)
@@ -0,0 +1,250 @@
+import io
+import os
+import sys
+import threading
+
+import numpy as np
+from PIL import Image
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import PatchCollection
+from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
+
+from dataset_cache import database_fingerprint
+from db_pool import pool
+from tracker_grid import TrackerGrid
+
+# Top view of the detector in mm: y runs along the foil, x across it with
+# side 0 drawn above the foil and side 1 below, as in the pics_* images
+NUM_CALO_COLUMNS = 20
+NUM_CALO_ROWS = 13
+NUM_TRACKER_LAYERS = 9
+NUM_TRACKER_ROWS = 113
+CALO_COLUMN_WIDTH = 259.0
+TRACKER_CELL_PITCH = 44.0
+TRACKER_FIRST_LAYER_X = 30.0
+CALO_WALL_X = 435.0
+CALO_WALL_DEPTH = 200.0
+MAIN_WALL_TYPE = 1302
+OMS_PER_SIDE = NUM_CALO_COLUMNS * NUM_CALO_ROWS
+
+TRACK_QUERY = """
+SELECT vertex_position_x, vertex_position_y, vertex_position_z, S, W, C, R, Type
+FROM tracks
+WHERE event_number = ?
+"""
+CALO_QUERY = """
+SELECT energy, calo_hit_time, om_number
+FROM calo_hits
+WHERE event_number = ?
+"""
+
+
+def fetch_event(conn, event_number):
+    cursor = conn.cursor()
+    cursor.execute(TRACK_QUERY, (int(event_number),))
+    tracks = cursor.fetchall()
+    cursor.execute(CALO_QUERY, (int(event_number),))
+    calo_hits = cursor.fetchall()
+    return tracks, calo_hits
+
+
+def side_sign(side):
+    # Side 0 is drawn above the foil
+    return 1.0 if side == 0 else -1.0
+
+
+def calo_column_y(column):
+    return (column - NUM_CALO_COLUMNS / 2 + 0.5) * CALO_COLUMN_WIDTH
+
+
+def tracker_cell_centres():
+    layers = np.arange(NUM_TRACKER_LAYERS)
+    rows = np.arange(NUM_TRACKER_ROWS)
+    row_y = (rows - NUM_TRACKER_ROWS / 2 + 0.5) * TRACKER_CELL_PITCH
+    layer_x = TRACKER_FIRST_LAYER_X + (layers + 0.5) * TRACKER_CELL_PITCH
+    y, x = np.meshgrid(row_y, layer_x)
+    y = np.concatenate([y.ravel(), y.ravel()])
+    x = np.concatenate([x.ravel(), -x.ravel()])
+    return y, x
+
+
+TRACKER_CELL_Y, TRACKER_CELL_X = tracker_cell_centres()
+TRACKER_GRID = TrackerGrid(np.column_stack([TRACKER_CELL_Y, TRACKER_CELL_X]), TRACKER_CELL_PITCH / 2)
+
+
+def hit_main_wall_modules(tracks, calo_hits):
+    # (side, column) of every main-wall OM seen in the event
+    modules = set()
+    for track in tracks:
+        side, column, om_type = track[3], track[5], track[7]
+        if side is not None and side >= 0 and column is not None and column >= 0 \
+                and om_type == MAIN_WALL_TYPE:
+            modules.add((int(side), int(column)))
+    for _, _, om_number in calo_hits:
+        if om_number is not None and 0 <= om_number < 2 * OMS_PER_SIDE:
+            side, om_in_side = divmod(int(om_number), OMS_PER_SIDE)
+            modules.add((side, om_in_side // NUM_CALO_ROWS))
+    return modules
+
+
+def track_segments(tracks):
+    # Straight line from the vertex on the foil to the centre of the OM the
+    # track ends in; tracks without both ends are not drawn
+    segments = []
+    for track in tracks:
+        vertex_y = track[1]
+        side, column, om_type = track[3], track[5], track[7]
+        if vertex_y is None or vertex_y == -1.0:
+            continue
+        if side is None or side < 0 or column is None or column < 0 or om_type != MAIN_WALL_TYPE:
+            continue
+        sign = side_sign(side)
+        segments.append(((vertex_y, 0.0), (calo_column_y(column), sign * CALO_WALL_X)))
+    return segments
+
+
+def cells_crossed(segments):
+    starts = [start for start, _ in segments]
+    ends = [end for _, end in segments]
+    return TRACKER_GRID.crossed_mask(starts, ends)
+
+
+def module_corner(side, column):
+    left = calo_column_y(column) - CALO_COLUMN_WIDTH / 2
+    bottom = CALO_WALL_X if side_sign(side) > 0 else -CALO_WALL_X - CALO_WALL_DEPTH
+    return left, bottom
+
+
+class EventDisplay:
+    # The detector layout is drawn once and kept as a bitmap; each event
+    # restores it and draws only its own hits, tracks and vertices on top.
+    # Not thread-safe: use one instance per thread or process.
+
+    def __init__(self):
+        self.figure = Figure(figsize=(16, 4), dpi=100)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_axes([0.01, 0.02, 0.98, 0.9])
+        self.ax.set_aspect("equal")
+        self.ax.axis("off")
+
+        self.module_labels = {}
+        modules = []
+        for side in (0, 1):
+            for column in range(NUM_CALO_COLUMNS):
+                left, bottom = module_corner(side, column)
+                modules.append(Rectangle((left, bottom), CALO_COLUMN_WIDTH, CALO_WALL_DEPTH))
+                self.module_labels[(side, column)] = self.ax.text(
+                    left + CALO_COLUMN_WIDTH / 2, bottom + CALO_WALL_DEPTH / 2,
+                    f"M:{side}.{column}.*", ha="center", va="center", fontsize=6)
+        self.ax.add_collection(PatchCollection(modules, facecolors="white", edgecolors="black",
+                                               linewidths=0.5))
+        self.ax.scatter(TRACKER_CELL_Y, TRACKER_CELL_X, s=12, facecolors="white",
+                        edgecolors="black", linewidths=0.3)
+
+        half_length = NUM_CALO_COLUMNS * CALO_COLUMN_WIDTH / 2
+        self.ax.plot([-half_length, half_length], [0, 0], color="goldenrod", linewidth=2)
+        self.ax.set_xlim(-half_length - 50, half_length + 50)
+        self.ax.set_ylim(-CALO_WALL_X - CALO_WALL_DEPTH - 20, CALO_WALL_X + CALO_WALL_DEPTH + 20)
+
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.title = self.figure.text(0.5, 0.95, "", ha="center", va="center", fontsize=12)
+
+    def event_artists(self, event_number, tracks, calo_hits):
+        self.title.set_text(f"Event {int(event_number)}")
+        artists = []
+
+        hit_modules = sorted(hit_main_wall_modules(tracks, calo_hits))
+        if hit_modules:
+            artists.append(PatchCollection(
+                [Rectangle(module_corner(side, column), CALO_COLUMN_WIDTH, CALO_WALL_DEPTH)
+                 for side, column in hit_modules],
+                facecolors="lime", edgecolors="black", linewidths=0.5))
+
+        segments = track_segments(tracks)
+        crossed = cells_crossed(segments)
+        if crossed.any():
+            artists.append(self.ax.scatter(TRACKER_CELL_Y[crossed], TRACKER_CELL_X[crossed], s=12,
+                                           facecolors="darkblue", edgecolors="black", linewidths=0.3))
+        for (y0, x0), (y1, x1) in segments:
+            artists.extend(self.ax.plot([y0, y1], [x0, x1], color="red", linewidth=1))
+        vertices = [(track[1], 0.0) for track in tracks if track[1] is not None and track[1] != -1.0]
+        if vertices:
+            artists.append(self.ax.scatter(*zip(*vertices), s=20, color="red", zorder=3))
+        return artists, hit_modules
+
+    def render_png(self, event_number, tracks, calo_hits):
+        artists, hit_modules = self.event_artists(event_number, tracks, calo_hits)
+        self.canvas.restore_region(self.background)
+        for artist in artists:
+            if artist.axes is None:
+                self.ax.add_collection(artist)
+            self.ax.draw_artist(artist)
+        for module in hit_modules:
+            self.ax.draw_artist(self.module_labels[module])
+        self.figure.draw_artist(self.title)
+
+        buffer = io.BytesIO()
+        Image.fromarray(np.asarray(self.canvas.buffer_rgba())).save(buffer, format="png")
+        for artist in artists:
+            artist.remove()
+        return buffer.getvalue()
+
+
+display_per_thread = threading.local()
+
+
+def render_event_png(event_number, tracks, calo_hits):
+    if not hasattr(display_per_thread, "display"):
+        display_per_thread.display = EventDisplay()
+    return display_per_thread.display.render_png(event_number, tracks, calo_hits)
+
+
+class RenderedImageSource:
+    # Image source (see image_pack) that uses pre-rendered images when the
+    # fallback source has them and draws the event from the database when
+    # it does not. Each call checks a connection out of the shared pool so
+    # it can run on the image cache's worker threads.
+
+    def __init__(self, database_path, prerendered=None):
+        self.database_path = database_path
+        self.prerendered = prerendered
+        prerendered_name = prerendered.name if prerendered is not None else ""
+        # The fingerprint changes with the database, so images cached under
+        # this name (in memory or as thumbnails on disk) go stale with it.
+        # The location stays the same, so stale thumbnails can be found.
+        self.location = f"{os.path.abspath(database_path)}|{prerendered_name}"
+        self.name = f"{os.path.abspath(database_path)}|{database_fingerprint(database_path)}|{prerendered_name}"
+
+    def read_bytes(self, event_number):
+        if self.prerendered is not None:
+            data = self.prerendered.read_bytes(event_number)
+            if data is not None:
+                return data
+
+        tracks, calo_hits = self.fetch_event_rows(event_number)
+        if not tracks and not calo_hits:
+            return None
+        return render_event_png(event_number, tracks, calo_hits)
+
+    def fetch_event_rows(self, event_number):
+        with pool.connection(self.database_path) as conn, pool.timed("fetch event"):
+            return fetch_event(conn, event_number)
+
+
+def main():
+    if len(sys.argv) < 4:
+        print("Usage: python event_renderer.py <database> <event_number> <output.png>")
+        return
+
+    database_path, event_number, output_path = sys.argv[1], int(sys.argv[2]), sys.argv[3]
+    with pool.connection(database_path) as conn:
+        tracks, calo_hits = fetch_event(conn, event_number)
+    with open(output_path, "wb") as output_file:
+        output_file.write(render_event_png(event_number, tracks, calo_hits))
+    print(f"Rendered event {event_number} to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+S_STATUS_CATEGORIES = ["Equal", "Different"]
+# Stores merged from several runs (see run_merge) carry the run each event
+# came from, and events are addressed by a key combining run and number
+RUN_COLUMN = "run"
+EVENT_KEY_BITS = 40
+
+
+def count_dtype(values):
+    # Smallest unsigned nullable integer type that holds every count;
+    # events with no tracks or no calo hits stay missing rather than 0
+    largest = values.max()
+    if pd.isna(largest):
+        largest = 0
+    return {
+        np.uint8: "UInt8", np.uint16: "UInt16", np.uint32: "UInt32",
+    }.get(np.min_scalar_type(int(largest)).type, "UInt64")
+
+
+def event_number_dtype(values):
+    if len(values) and values.min() >= np.iinfo(np.int32).min and values.max() <= np.iinfo(np.int32).max:
+        return np.int32
+    return np.int64
+
+
+def compact_events(df):
+    # df: per-event summary from read_summary, one row per event
+    compact = pd.DataFrame({
+        "num_tracks": df["num_tracks"].astype(count_dtype(df["num_tracks"])).array,
+        "num_calo_hits": df["num_calo_hits"].astype(count_dtype(df["num_calo_hits"])).array,
+        "total_energy": df["total_energy"].to_numpy(dtype=np.float32),
+        "time_diff": df["time_diff"].to_numpy(dtype=np.float32),
+        "s_status": pd.Categorical(df["s_status"], categories=S_STATUS_CATEGORIES),
+    }, index=pd.Index(df["event_number"].to_numpy(dtype=event_number_dtype(df["event_number"])),
+                      name="event_number"))
+    return compact
+
+
+def event_key(run, event_number):
+    return (np.asarray(run, dtype=np.int64) << EVENT_KEY_BITS) | np.asarray(event_number, dtype=np.int64)
+
+
+def split_event_key(key):
+    key = int(key)
+    return key >> EVENT_KEY_BITS, key & ((1 << EVENT_KEY_BITS) - 1)
+
+
+def frame_memory(frame):
+    return int(frame.memory_usage(deep=True).sum())
+
+
+def footprint_report(frames):
+    lines = []
+    for name, frame in frames.items():
+        if not isinstance(frame, pd.DataFrame):
+            continue
+        columns = ", ".join(
+            f"{column} {frame[column].dtype} {frame[column].memory_usage(index=False, deep=True) / 2**20:.1f}"
+            for column in frame.columns
+        )
+        lines.append(f"  {name}: {len(frame)} rows, {frame_memory(frame) / 2**20:.1f} MB ({columns})")
+    return "\n".join(lines)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python event_store.py <database> [<database> ...]")
+        return
+
+    # Imported here as event_summary and event_stream build on this module
+    from event_stream import load_event_store
+    from event_summary import ensure_summary, read_summary, summary_supported
+
+    for db_path in sys.argv[1:]:
+        conn = sqlite3.connect(db_path)
+        try:
+            if summary_supported(conn):
+                ensure_summary(conn)
+                df, _ = read_summary(conn)
+            else:
+                # Already compact; read back as plain summary columns
+                df = load_event_store(conn)[0].reset_index()
+        finally:
+            conn.close()
+
+        compact = compact_events(df)
+        print(f"{db_path}: {frame_memory(df) / 2**20:.1f} MB as read, "
+              f"{frame_memory(compact) / 2**20:.1f} MB compact")
+        print(footprint_report({"df": compact}))
+
+
+if __name__ == "__main__":
+    main()
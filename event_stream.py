@@ -0,0 +1,201 @@
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from db_indexes import ensure_indexes
+from event_store import compact_events, frame_memory
+from histogram_engine import CALO_ENERGY_FINE_BINS, calo_energy_fine_bins
+
+DEFAULT_CHUNK_ROWS = 200000
+
+# Both scans are ordered by the covering indexes from db_indexes, so
+# SQLite walks the index instead of sorting the table
+TRACK_STREAM_QUERY = """
+SELECT event_number, S FROM tracks
+WHERE event_number IS NOT NULL
+ORDER BY event_number, S
+"""
+CALO_STREAM_QUERY = """
+SELECT event_number, energy, calo_hit_time FROM calo_hits
+WHERE event_number IS NOT NULL
+ORDER BY event_number, energy, calo_hit_time
+"""
+
+
+class OrderedRows:
+    # Rows of one event-ordered query, fetched chunk by chunk into float
+    # arrays (NULL becomes NaN). Column 0 is the event number.
+
+    def __init__(self, cursor, query, num_columns, chunk_rows):
+        cursor.execute(query)
+        self.cursor = cursor
+        self.chunk_rows = chunk_rows
+        self.rows = np.empty((0, num_columns))
+        self.exhausted = False
+
+    def last_event(self):
+        return self.rows[-1, 0]
+
+    def fill(self):
+        fetched = self.cursor.fetchmany(self.chunk_rows)
+        if not fetched:
+            self.exhausted = True
+            return
+        self.rows = np.concatenate([self.rows, np.array(fetched, dtype=np.float64)])
+
+    def take_before(self, boundary):
+        split = np.searchsorted(self.rows[:, 0], boundary, side="left")
+        taken, self.rows = self.rows[:split], self.rows[split:]
+        return taken
+
+
+def group_starts(event_numbers):
+    # event_numbers is sorted; start of each run of equal values
+    if not len(event_numbers):
+        return np.array([], dtype=np.int64)
+    starts = np.flatnonzero(event_numbers[1:] != event_numbers[:-1]) + 1
+    return np.concatenate([[0], starts])
+
+
+def summarise_chunk(tracks, calo_hits):
+    # Per-event summary of the events whose rows are all in this chunk.
+    # time_diff is only filled in for events with more than one track and
+    # more than one calo hit, s_status only for events with tracks.
+    track_events = tracks[:, 0]
+    track_starts = group_starts(track_events)
+    track_event_numbers = track_events[track_starts]
+    num_tracks = np.diff(np.append(track_starts, len(track_events)))
+
+    # COUNT(DISTINCT S): rows are sorted by (event, S), so count changes
+    sides = tracks[:, 1]
+    known = ~np.isnan(sides)
+    known_events, known_sides = track_events[known], sides[known]
+    new_side = np.ones(len(known_sides), dtype=bool)
+    new_side[1:] = (known_events[1:] != known_events[:-1]) | (known_sides[1:] != known_sides[:-1])
+    num_sides = np.bincount(np.searchsorted(track_event_numbers, known_events[new_side]),
+                            minlength=len(track_event_numbers))
+
+    calo_events = calo_hits[:, 0]
+    calo_starts = group_starts(calo_events)
+    calo_event_numbers = calo_events[calo_starts]
+    num_calo_hits = np.diff(np.append(calo_starts, len(calo_events)))
+    energy, hit_time = calo_hits[:, 1], calo_hits[:, 2]
+    calo_group = np.repeat(np.arange(len(calo_starts)), num_calo_hits)
+    # SUM ignores NULLs and is NULL when every value is
+    total_energy = np.bincount(calo_group, weights=np.nan_to_num(energy),
+                               minlength=len(calo_starts)).astype(np.float64)
+    total_energy[np.bincount(calo_group, weights=~np.isnan(energy), minlength=len(calo_starts)) == 0] = np.nan
+    if len(calo_starts):
+        with np.errstate(invalid="ignore"):
+            hit_time_span = np.fmax.reduceat(hit_time, calo_starts) - np.fmin.reduceat(hit_time, calo_starts)
+    else:
+        hit_time_span = np.array([])
+
+    event_numbers = np.union1d(track_event_numbers, calo_event_numbers)
+    summary = pd.DataFrame({
+        "event_number": event_numbers.astype(np.int64),
+        "num_tracks": np.nan,
+        "num_calo_hits": np.nan,
+        "total_energy": np.nan,
+        "time_diff": np.nan,
+        "s_status": pd.Series([None] * len(event_numbers), dtype=object),
+    })
+    track_rows = np.searchsorted(event_numbers, track_event_numbers)
+    calo_rows = np.searchsorted(event_numbers, calo_event_numbers)
+    summary.loc[track_rows, "num_tracks"] = num_tracks
+    summary.loc[track_rows, "s_status"] = np.where(num_sides == 1, "Equal", "Different")
+    summary.loc[calo_rows, "num_calo_hits"] = num_calo_hits
+    summary.loc[calo_rows, "total_energy"] = total_energy
+
+    span = np.full(len(event_numbers), np.nan)
+    span[calo_rows] = hit_time_span
+    has_time_diff = (summary["num_tracks"] > 1) & (summary["num_calo_hits"] > 1)
+    summary["time_diff"] = np.where(has_time_diff, span, np.nan)
+    return summary, energy
+
+
+class CaloEnergyHistogram:
+    # Counts on the fine binning from histogram_engine, filled chunk by
+    # chunk; the same for every run, so merged runs just add them up
+
+    def __init__(self):
+        self.counts = np.zeros(CALO_ENERGY_FINE_BINS, dtype=np.int64)
+
+    def add(self, energies):
+        energies = energies[~np.isnan(energies)]
+        if len(energies):
+            self.counts += np.bincount(calo_energy_fine_bins(energies), minlength=CALO_ENERGY_FINE_BINS)
+
+    def frame(self):
+        return pd.DataFrame({"count": self.counts})
+
+
+def stream_events(conn, chunk_rows=DEFAULT_CHUNK_ROWS, calo_histogram=None):
+    # Yields per-event summaries (read_summary columns) a chunk at a time.
+    # Only about chunk_rows rows of each table are held at once: the
+    # stream that is behind is refilled and every event both streams have
+    # moved past is summarised and dropped.
+    streams = [
+        OrderedRows(conn.cursor(), TRACK_STREAM_QUERY, 2, chunk_rows),
+        OrderedRows(conn.cursor(), CALO_STREAM_QUERY, 3, chunk_rows),
+    ]
+    while True:
+        active = [stream for stream in streams if not stream.exhausted]
+        if not active:
+            break
+        lagging = min(active, key=lambda stream: stream.last_event() if len(stream.rows) else -np.inf)
+        lagging.fill()
+
+        active = [stream for stream in streams if not stream.exhausted]
+        if any(not len(stream.rows) for stream in active):
+            continue
+        boundary = min((stream.last_event() for stream in active), default=np.inf)
+        tracks, calo_hits = (stream.take_before(boundary) for stream in streams)
+        if len(tracks) or len(calo_hits):
+            summary, energies = summarise_chunk(tracks, calo_hits)
+            if calo_histogram is not None:
+                calo_histogram.add(energies)
+            yield summary
+
+
+def load_event_store(conn, chunk_rows=DEFAULT_CHUNK_ROWS):
+    # Compact event store plus the individual calo energy histogram, with
+    # only one chunk of rows uncompacted at any time
+    calo_histogram = CaloEnergyHistogram()
+    chunks = [compact_events(summary) for summary in stream_events(conn, chunk_rows, calo_histogram)]
+    if chunks:
+        df = pd.concat(chunks)
+        # Counts are typed per chunk, so settle on one type for the whole run
+        df = compact_events(df.reset_index())
+    else:
+        df = compact_events(pd.DataFrame({
+            "event_number": np.array([], dtype=np.int64), "num_tracks": [], "num_calo_hits": [],
+            "total_energy": [], "time_diff": [], "s_status": pd.Series([], dtype=object),
+        }))
+    return df, calo_histogram.frame()
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python event_stream.py <database> [<chunk_rows>]")
+        return
+
+    database_path = sys.argv[1]
+    chunk_rows = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_CHUNK_ROWS
+    conn = sqlite3.connect(database_path)
+    try:
+        ensure_indexes(conn)
+        start = time.perf_counter()
+        df, calo_energy = load_event_store(conn, chunk_rows)
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - start
+    print(f"{database_path}: {len(df)} events in {elapsed:.1f}s, "
+          f"{frame_memory(df) / 2**20:.1f} MB, {int(calo_energy['count'].sum())} calo hits binned")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+
+from db_indexes import ensure_indexes
+from event_stream import load_event_store
+from histogram_engine import CALO_ENERGY_FINE_BINS
+
+SUMMARY_TABLE = "event_summary"
+SUMMARY_CALO_TABLE = "event_summary_calo_energy"
+SUMMARY_META_TABLE = "event_summary_meta"
+# Bumped whenever the stored tables or the calo energy binning change
+SUMMARY_FORMAT = "v2"
+
+
+def file_change_counter(conn):
+    # Bytes 24-27 of the database header count committed write
+    # transactions, so in-place UPDATEs show up here even when no row
+    # count does. The file's mtime and size would not do: writing the
+    # summary into the same file changes them. WAL commits leave the
+    # counter alone, so it says nothing about a WAL database (see
+    # summary_supported).
+    database_path = conn.execute("PRAGMA database_list").fetchone()[2]
+    with open(database_path, "rb") as database_file:
+        database_file.seek(24)
+        return int.from_bytes(database_file.read(4), "big")
+
+
+def journal_mode(conn):
+    return conn.execute("PRAGMA journal_mode").fetchone()[0].lower()
+
+
+def summary_supported(conn):
+    # Without a change counter an in-place UPDATE of a WAL database would
+    # go unnoticed, so its summary is neither stored nor read back
+    return journal_mode(conn) != "wal"
+
+
+def source_fingerprint(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*), MAX(rowid) FROM tracks")
+    tracks_count, tracks_rowid = cursor.fetchone()
+    cursor.execute("SELECT COUNT(*), MAX(rowid) FROM calo_hits")
+    calo_count, calo_rowid = cursor.fetchone()
+    return tracks_count, tracks_rowid or 0, calo_count, calo_rowid or 0, file_change_counter(conn)
+
+
+def stored_fingerprint(conn):
+    if not summary_supported(conn):
+        return None
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN (?, ?, ?)",
+        (SUMMARY_TABLE, SUMMARY_CALO_TABLE, SUMMARY_META_TABLE),
+    )
+    if cursor.fetchone()[0] != 3:
+        return None
+
+    cursor.execute(f"SELECT * FROM {SUMMARY_META_TABLE}")
+    stored = cursor.fetchone()
+    if stored is None or stored[0] != SUMMARY_FORMAT:
+        return None
+    return tuple(stored[1:])
+
+
+def summary_is_current(conn):
+    return stored_fingerprint(conn) == source_fingerprint(conn)
+
+
+def column_values(values):
+    # Python values for sqlite3, NULL for missing
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=np.float64, na_value=np.nan).tolist()
+    return values.astype(object).where(values.notna(), None).tolist()
+
+
+def write_summary(conn, df, calo_energy, fingerprint):
+    # df is the compact event store and calo_energy the fine calo energy
+    # counts that load_event_store made from the database when it had
+    # this fingerprint. Nothing is written if it has changed since.
+    with conn:
+        # The check and the writes happen under one write lock, and this
+        # transaction's own commit bumps the change counter exactly once
+        conn.execute("BEGIN IMMEDIATE")
+        if source_fingerprint(conn) != fingerprint:
+            return False
+        conn.execute(f"DROP TABLE IF EXISTS {SUMMARY_TABLE}")
+        conn.execute(f"DROP TABLE IF EXISTS {SUMMARY_CALO_TABLE}")
+        conn.execute(f"DROP TABLE IF EXISTS {SUMMARY_META_TABLE}")
+        conn.execute(
+            f"CREATE TABLE {SUMMARY_TABLE} (event_number INTEGER PRIMARY KEY, num_tracks INTEGER, "
+            f"num_calo_hits INTEGER, total_energy REAL, time_diff REAL, s_status TEXT)"
+        )
+        # SQLite stores the NaNs of missing values as NULL
+        conn.executemany(
+            f"INSERT INTO {SUMMARY_TABLE} VALUES (?, ?, ?, ?, ?, ?)",
+            zip(df.index.to_numpy(dtype=np.int64).tolist(),
+                *(column_values(df[column]) for column in
+                  ["num_tracks", "num_calo_hits", "total_energy", "time_diff", "s_status"])),
+        )
+
+        # Only the occupied fine bins
+        counts = calo_energy["count"].to_numpy()
+        occupied = np.flatnonzero(counts)
+        conn.execute(f"CREATE TABLE {SUMMARY_CALO_TABLE} (bin INTEGER PRIMARY KEY, count INTEGER)")
+        conn.executemany(f"INSERT INTO {SUMMARY_CALO_TABLE} VALUES (?, ?)",
+                         zip(occupied.tolist(), counts[occupied].tolist()))
+
+        conn.execute(
+            f"CREATE TABLE {SUMMARY_META_TABLE} (format TEXT, tracks_count INTEGER, tracks_rowid INTEGER, "
+            f"calo_count INTEGER, calo_rowid INTEGER, change_counter INTEGER)"
+        )
+        conn.execute(f"INSERT INTO {SUMMARY_META_TABLE} VALUES (?, ?, ?, ?, ?, ?)",
+                     (SUMMARY_FORMAT,) + fingerprint[:-1] + (fingerprint[-1] + 1,))
+    return True
+
+
+def build_summary(conn):
+    fingerprint = source_fingerprint(conn)
+    df, calo_energy = load_event_store(conn)
+    return write_summary(conn, df, calo_energy, fingerprint)
+
+
+def ensure_summary(conn):
+    if not summary_supported(conn) or summary_is_current(conn):
+        return False
+    build_summary(conn)
+    return True
+
+
+def read_summary(conn):
+    # Per-event summary rows and the fine calo energy counts
+    query = f"""
+    SELECT event_number, num_tracks, num_calo_hits, total_energy, time_diff, s_status
+    FROM {SUMMARY_TABLE}
+    ORDER BY event_number
+    """
+    # Explicit dtypes so an all-NULL column (e.g. no calo hits) stays numeric
+    dtypes = {
+        "num_tracks": "float64",
+        "num_calo_hits": "float64",
+        "total_energy": "float64",
+        "time_diff": "float64",
+    }
+    df = pd.read_sql_query(query, conn, dtype=dtypes)
+
+    counts = np.zeros(CALO_ENERGY_FINE_BINS, dtype=np.int64)
+    rows = np.array(conn.execute(f"SELECT bin, count FROM {SUMMARY_CALO_TABLE}").fetchall(),
+                    dtype=np.int64).reshape(-1, 2)
+    counts[rows[:, 0]] = rows[:, 1]
+    return df, pd.DataFrame({"count": counts})
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python event_summary.py <database> [<database> ...]")
+        return
+
+    for db_path in sys.argv[1:]:
+        conn = sqlite3.connect(db_path)
+        try:
+            ensure_indexes(conn)
+            if not summary_supported(conn):
+                print(f"{db_path}: WAL database, not storing a summary")
+                continue
+            build_summary(conn)
+            num_events = conn.execute(f"SELECT COUNT(*) FROM {SUMMARY_TABLE}").fetchone()[0]
+            print(f"{db_path}: summarised {num_events} events")
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
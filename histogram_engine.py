@@ -0,0 +1,179 @@
+import numpy as np
+
+HISTOGRAM_BINS = 50
+# Fine total-energy bins per MeV. The energy cuts are whole MeV, so any
+# cut range splits evenly into HISTOGRAM_BINS display bins of fine bins.
+ENERGY_FINE_BINS_PER_MEV = HISTOGRAM_BINS
+TIME_DIFF_RANGE = (0, 10)
+# Largest values the cut buttons go up to. Anything above lands in one
+# overflow slot, so the pre-binned arrays stay bounded however extreme a
+# run's events are, and a maximum cut at one of these values means "and
+# above" and includes that slot.
+MAX_ENERGY_CUT = 20
+MAX_TRACKS_CUT = 20
+MAX_CALO_HITS_CUT = 50
+# Individual calo hit energies are counted on one fine binning shared by
+# every run, so runs merge by adding counts and are only rebinned for
+# display. Energies outside the range go into the first or last bin.
+CALO_ENERGY_FINE_BIN_MEV = 0.001
+CALO_ENERGY_FINE_BINS = 20000
+
+
+def calo_energy_fine_bins(energies):
+    return np.clip(np.floor(energies / CALO_ENERGY_FINE_BIN_MEV), 0, CALO_ENERGY_FINE_BINS - 1).astype(np.int64)
+
+
+def calo_energy_display(fine_counts):
+    # HISTOGRAM_BINS equal bins over the occupied fine bins
+    occupied = np.flatnonzero(fine_counts)
+    if not len(occupied):
+        return np.zeros(HISTOGRAM_BINS, dtype=np.int64), np.linspace(0.0, 1.0, HISTOGRAM_BINS + 1)
+    first = occupied[0]
+    per_bin = -(-(occupied[-1] + 1 - first) // HISTOGRAM_BINS)
+    padded = np.zeros(HISTOGRAM_BINS * per_bin, dtype=np.int64)
+    selected = fine_counts[first:first + len(padded)]
+    padded[:len(selected)] = selected
+    edges = (first + per_bin * np.arange(HISTOGRAM_BINS + 1)) * CALO_ENERGY_FINE_BIN_MEV
+    return padded.reshape(HISTOGRAM_BINS, -1).sum(axis=1), edges
+
+
+class CutHistograms:
+    # Pre-binned histograms of the plotted quantities, split by the cut
+    # variables (side, num_tracks, num_calo_hits, whole-MeV energy cell).
+    # A cut change is then a slice-and-sum over these arrays instead of a
+    # rescan of every event.
+
+    def __init__(self, df, calo_energy):
+        valid = (
+            df['num_tracks'].notna() &
+            df['num_calo_hits'].notna() &
+            df['total_energy'].notna() &
+            (df['total_energy'] >= 0)
+        ).to_numpy()
+
+        side = (df['s_status'] == 'Different').to_numpy()[valid].astype(np.int64)
+        tracks = df['num_tracks'].to_numpy(dtype=np.float64, na_value=np.nan)[valid].astype(np.int64)
+        calo_hits = df['num_calo_hits'].to_numpy(dtype=np.float64, na_value=np.nan)[valid].astype(np.int64)
+        energy = df['total_energy'].to_numpy(dtype=np.float64)[valid]
+        time_diff = df['time_diff'].to_numpy(dtype=np.float64)[valid]
+
+        tracks = np.minimum(tracks, MAX_TRACKS_CUT + 1)
+        calo_hits = np.minimum(calo_hits, MAX_CALO_HITS_CUT + 1)
+        energy_cell = np.minimum(np.floor(energy), MAX_ENERGY_CUT).astype(np.int64)
+        fine_bin = np.minimum(np.floor(energy * ENERGY_FINE_BINS_PER_MEV),
+                              MAX_ENERGY_CUT * ENERGY_FINE_BINS_PER_MEV).astype(np.int64)
+        # Events exactly on a whole MeV pass an `energy <= max` cut at that
+        # value, so they are also counted separately to add back in. At
+        # MAX_ENERGY_CUT the whole overflow cell passes anyway.
+        on_edge = (energy == energy_cell) & (energy < MAX_ENERGY_CUT)
+
+        num_tracks = int(tracks.max()) + 1 if len(tracks) else 1
+        num_calo_hits = int(calo_hits.max()) + 1 if len(calo_hits) else 1
+        num_cells = int(energy_cell.max()) + 1 if len(energy_cell) else 1
+        group_shape = (2, num_tracks, num_calo_hits)
+
+        self.energy_counts = self.count(
+            group_shape + (num_cells * ENERGY_FINE_BINS_PER_MEV,),
+            side, tracks, calo_hits, fine_bin,
+        )
+        self.energy_edge_counts = self.count(
+            group_shape + (num_cells,),
+            side[on_edge], tracks[on_edge], calo_hits[on_edge], energy_cell[on_edge],
+        )
+
+        time_low, time_high = TIME_DIFF_RANGE
+        time_width = (time_high - time_low) / HISTOGRAM_BINS
+        in_range = (time_diff >= time_low) & (time_diff <= time_high)
+        time_bin = np.minimum(
+            ((time_diff[in_range] - time_low) / time_width).astype(np.int64), HISTOGRAM_BINS - 1
+        )
+        time_shape = group_shape + (num_cells, HISTOGRAM_BINS)
+        self.time_diff_counts = self.count(
+            time_shape,
+            side[in_range], tracks[in_range], calo_hits[in_range], energy_cell[in_range], time_bin,
+        )
+        time_edge = on_edge[in_range]
+        self.time_diff_edge_counts = self.count(
+            time_shape,
+            side[in_range][time_edge], tracks[in_range][time_edge],
+            calo_hits[in_range][time_edge], energy_cell[in_range][time_edge], time_bin[time_edge],
+        )
+        self.time_diff_edges = np.linspace(time_low, time_high, HISTOGRAM_BINS + 1)
+
+        # Individual calo energies do not depend on the cuts at all, so they
+        # arrive already binned (see event_stream.CaloEnergyHistogram)
+        self.calo_energy_counts, self.calo_energy_edges = calo_energy_display(calo_energy['count'].to_numpy())
+
+    @staticmethod
+    def count(shape, *indices):
+        flat_index = np.ravel_multi_index(indices, shape)
+        counts = np.bincount(flat_index, minlength=int(np.prod(shape)))
+        return counts.reshape(shape).astype(np.int32)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (
+            self.energy_counts, self.energy_edge_counts,
+            self.time_diff_counts, self.time_diff_edge_counts,
+        ))
+
+    def group_slices(self, min_tracks, max_tracks, min_calo_hits, max_calo_hits,
+                     same_side, different_side):
+        sides = [0, 1]
+        if same_side:
+            sides = [side for side in sides if side == 0]
+        if different_side:
+            sides = [side for side in sides if side == 1]
+        if not sides:
+            return None
+        if max_tracks >= MAX_TRACKS_CUT:
+            max_tracks = MAX_TRACKS_CUT + 1
+        if max_calo_hits >= MAX_CALO_HITS_CUT:
+            max_calo_hits = MAX_CALO_HITS_CUT + 1
+        return (
+            slice(sides[0], sides[-1] + 1),
+            slice(max(min_tracks, 0), max(max_tracks + 1, 0)),
+            slice(max(min_calo_hits, 0), max(max_calo_hits + 1, 0)),
+        )
+
+    def total_energy(self, min_energy, max_energy, min_tracks, max_tracks,
+                     min_calo_hits, max_calo_hits, same_side, different_side):
+        edges = np.linspace(min_energy, max_energy, HISTOGRAM_BINS + 1)
+        counts = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+        groups = self.group_slices(min_tracks, max_tracks, min_calo_hits, max_calo_hits,
+                                   same_side, different_side)
+        if groups is None or max_energy <= min_energy:
+            return counts, edges
+
+        fine_counts = self.energy_counts[groups].sum(axis=(0, 1, 2))
+        padded = np.zeros((max_energy - min_energy) * ENERGY_FINE_BINS_PER_MEV, dtype=np.int64)
+        start = min_energy * ENERGY_FINE_BINS_PER_MEV
+        selected = fine_counts[start:start + len(padded)]
+        padded[:len(selected)] = selected
+        counts = padded.reshape(HISTOGRAM_BINS, -1).sum(axis=1)
+
+        # Like np.histogram, the last bin is closed on the right. At the
+        # largest cut it also takes every event above.
+        if max_energy >= MAX_ENERGY_CUT:
+            counts[-1] += fine_counts[MAX_ENERGY_CUT * ENERGY_FINE_BINS_PER_MEV:].sum()
+            return counts, edges
+        edge_counts = self.energy_edge_counts[groups].sum(axis=(0, 1, 2))
+        if max_energy < len(edge_counts):
+            counts[-1] += edge_counts[max_energy]
+        return counts, edges
+
+    def time_diff(self, min_energy, max_energy, min_tracks, max_tracks,
+                  min_calo_hits, max_calo_hits, same_side, different_side):
+        counts = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+        groups = self.group_slices(min_tracks, max_tracks, min_calo_hits, max_calo_hits,
+                                   same_side, different_side)
+        if groups is None or max_energy < min_energy:
+            return counts, self.time_diff_edges
+
+        if max_energy >= MAX_ENERGY_CUT:
+            counts += self.time_diff_counts[groups + (slice(min_energy, None),)].sum(axis=(0, 1, 2, 3))
+            return counts, self.time_diff_edges
+        counts += self.time_diff_counts[groups + (slice(min_energy, max_energy),)].sum(axis=(0, 1, 2, 3))
+        if max_energy < self.time_diff_edge_counts.shape[3]:
+            counts += self.time_diff_edge_counts[groups + (max_energy,)].sum(axis=(0, 1, 2))
+        return counts, self.time_diff_edges
@@ -0,0 +1,27 @@
+from PyQt5.QtGui import QImage, QPixmap
+
+from prefetch_cache import PrefetchCache
+
+
+def decode_image(source, event_number):
+    # source is an ImageDirectory or ImagePack from image_pack
+    data = source.read_bytes(event_number)
+    if data is None:
+        return None
+    image = QImage.fromData(data)
+    return None if image.isNull() else image
+
+
+class PixmapCache(PrefetchCache):
+    # Decoded event images by (image source, event number). QPixmap may
+    # only be created on the GUI thread, so workers decode to a QImage
+    # and it is converted once it arrives back there.
+
+    def __init__(self, max_entries=64, parent=None):
+        super().__init__(max_entries, 2, parent)
+
+    def load(self, source, event_number):
+        return decode_image(source, event_number)
+
+    def to_entry(self, image):
+        return None if image is None else QPixmap.fromImage(image)
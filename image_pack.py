@@ -0,0 +1,146 @@
+import mmap
+import os
+import re
+import sys
+
+import numpy as np
+
+# Layout: magic, entry count, then the index sorted by event number, then
+# the PNG bytes back to back. Offsets are from the start of the file.
+PACK_MAGIC = b"SNPACK01"
+PACK_EXTENSION = ".snpack"
+INDEX_DTYPE = np.dtype([("event_number", "<i8"), ("offset", "<u8"), ("length", "<u8")])
+HEADER_SIZE = len(PACK_MAGIC) + 8
+IMAGE_NAME_PATTERN = re.compile(r"^\d+_(\d+)\.png$")
+
+
+class ImageDirectory:
+    # Loose 1295_<event>.png files, read the same way as a pack
+
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        self.name = os.path.abspath(base_dir)
+
+    def image_path(self, event_number):
+        return os.path.join(self.base_dir, f"1295_{int(event_number)}.png")
+
+    def read_bytes(self, event_number):
+        try:
+            with open(self.image_path(event_number), "rb") as image_file:
+                return image_file.read()
+        except OSError:
+            return None
+
+
+class ImagePack:
+    # Read-only, memory-mapped pack. Lookups are a binary search of the
+    # index, and reads are slices of the mapping, so this is safe to share
+    # between threads.
+
+    def __init__(self, pack_path):
+        self.name = os.path.abspath(pack_path)
+        with open(pack_path, "rb") as pack_file:
+            self.mapping = mmap.mmap(pack_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.mapping[:len(PACK_MAGIC)] != PACK_MAGIC:
+            self.mapping.close()
+            raise ValueError(f"{pack_path} is not an event image pack")
+        count = int(np.frombuffer(self.mapping, dtype="<u8", count=1, offset=len(PACK_MAGIC))[0])
+        self.index = np.frombuffer(self.mapping, dtype=INDEX_DTYPE, count=count, offset=HEADER_SIZE)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, event_number):
+        return self.find(event_number) is not None
+
+    def event_numbers(self):
+        return self.index["event_number"]
+
+    def find(self, event_number):
+        position = np.searchsorted(self.index["event_number"], int(event_number))
+        if position < len(self.index) and self.index["event_number"][position] == int(event_number):
+            return position
+        return None
+
+    def read_bytes(self, event_number):
+        position = self.find(event_number)
+        if position is None:
+            return None
+        offset = int(self.index["offset"][position])
+        length = int(self.index["length"][position])
+        return self.mapping[offset:offset + length]
+
+
+def build_index(entries):
+    # entries: (event_number, length) sorted by event number
+    index = np.zeros(len(entries), dtype=INDEX_DTYPE)
+    offset = HEADER_SIZE + index.nbytes
+    for position, (event_number, length) in enumerate(entries):
+        index[position] = (event_number, offset, length)
+        offset += length
+    return index
+
+
+def write_pack(pack_path, images, read_image=None):
+    # images: (event_number, png_bytes) pairs, or (event_number, length)
+    # pairs with read_image(event_number) supplying the bytes while writing
+    images = sorted(images, key=lambda item: item[0])
+    if read_image is None:
+        index = build_index([(event_number, len(data)) for event_number, data in images])
+    else:
+        index = build_index(images)
+
+    scratch_path = pack_path + ".tmp"
+    with open(scratch_path, "wb") as pack_file:
+        pack_file.write(PACK_MAGIC)
+        pack_file.write(np.array([len(images)], dtype="<u8").tobytes())
+        pack_file.write(index.tobytes())
+        for event_number, data in images:
+            pack_file.write(data if read_image is None else read_image(event_number))
+    os.replace(scratch_path, pack_path)
+
+
+def pack_directory(image_dir, pack_path):
+    # Streams one file at a time, so the pack never has to fit in memory
+    paths = {}
+    for file_name in os.listdir(image_dir):
+        match = IMAGE_NAME_PATTERN.match(file_name)
+        if match is not None:
+            paths[int(match.group(1))] = os.path.join(image_dir, file_name)
+
+    def read_image(event_number):
+        with open(paths[event_number], "rb") as image_file:
+            return image_file.read()
+
+    sizes = [(event_number, os.path.getsize(path)) for event_number, path in paths.items()]
+    write_pack(pack_path, sizes, read_image)
+    return len(paths)
+
+
+def pack_path_for(image_dir):
+    return os.path.normpath(image_dir) + PACK_EXTENSION
+
+
+def open_image_source(image_dir):
+    # Prefer the pack built from a directory when there is one
+    pack_path = pack_path_for(image_dir)
+    if os.path.exists(pack_path):
+        return ImagePack(pack_path)
+    return ImageDirectory(image_dir)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python image_pack.py <image_dir> [<image_dir> ...]")
+        return
+
+    for image_dir in sys.argv[1:]:
+        pack_path = pack_path_for(image_dir)
+        num_images = pack_directory(image_dir, pack_path)
+        size = os.path.getsize(pack_path)
+        print(f"{image_dir}: packed {num_images} images into {pack_path} ({size / 2**20:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,62 @@
 import sys
 import os
-import sqlite3
-import pandas as pd
+import numpy as np
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QWidget, 
                              QPushButton, QLabel, QCheckBox, QTabWidget, 
-                             QHBoxLayout, QComboBox, QGridLayout, QSlider)
-from PyQt5.QtGui import QPixmap, QFont
-from PyQt5.QtCore import Qt
+                             QHBoxLayout, QComboBox, QGridLayout, QSlider,
+                             QProgressBar, QFileDialog)
+from PyQt5.QtGui import QFont
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 
+from cut_engine import EventCuts
+from dataset_cache import DatasetLRU
+from dataset_loader import LoadCancelled
+from db_pool import pool
+from histogram_engine import MAX_CALO_HITS_CUT, MAX_ENERGY_CUT, MAX_TRACKS_CUT, CutHistograms
+from image_cache import PixmapCache
+from image_pack import open_image_source
+from event_renderer import RenderedImageSource
+from event_details import EventDetailCache, EventDetailPanel
+from plot_panels import HistogramPanel
+from run_merge import RunImageSource, dataset_fingerprint, expand_database_paths, is_run_set, load_dataset
+from thumbnail_strip import ThumbnailStrip
+
+class DatasetLoadThread(QThread):
+    progress = pyqtSignal(int, int, str)
+    loaded = pyqtSignal(int, str, object)
+    failed = pyqtSignal(int, str, str)
+
+    def __init__(self, request_id, database_path, parent=None):
+        super().__init__(parent)
+        self.request_id = request_id
+        self.database_path = database_path
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        try:
+            frames = load_dataset(self.database_path, self.report_progress, lambda: self.cancelled)
+            frames["histograms"] = CutHistograms(frames["df"], frames["calo_energy"])
+            frames["event_cuts"] = EventCuts(frames["df"])
+        except LoadCancelled:
+            print(f"Cancelled loading {self.database_path}")
+            return
+        except Exception as e:
+            self.failed.emit(self.request_id, self.database_path, str(e))
+            return
+        self.loaded.emit(self.request_id, self.database_path, frames)
+
+    def report_progress(self, step, total, message):
+        self.progress.emit(step, total, message or "")
+
 class MainWindow(QMainWindow):
     BASE_DIR = os.path.join(os.getcwd(), "pics_bg/")
+    PLOT_UPDATE_DELAY_MS = 120
+    PREFETCH_EVENTS = 5
 
     def __init__(self):
         super().__init__()
@@ -40,6 +85,7 @@ class MainWindow(QMainWindow):
         self.bottom_tabs.addTab(self.real_events_tab, "Real Events")
         self.bottom_tabs.addTab(self.analysis_plots_standard_tab, "Analysis Plots")
         self.bottom_tabs.addTab(self.analysis_plots_advanced_tab, "Advanced")
+        self.bottom_tabs.currentChanged.connect(self.on_bottom_tab_change)
         self.main_layout.addWidget(self.bottom_tabs)
 
         self.data_type_layout = QVBoxLayout(self.data_type)
@@ -49,17 +95,31 @@ class MainWindow(QMainWindow):
         self.data_type_layout.addWidget(QLabel("Select Data Type:"))
         self.data_type_layout.addWidget(self.data_type_dropdown)
 
+        # Several run databases (a directory of .db files) analysed as one
+        self.run_sets = {}
+        self.open_runs_button = QPushButton("Open Runs...")
+        self.open_runs_button.clicked.connect(self.choose_run_directory)
+        self.data_type_layout.addWidget(self.open_runs_button)
+
+        self.loading_label = QLabel()
+        self.loading_bar = QProgressBar()
+        self.loading_bar.setRange(0, 0)
+        self.loading_label.setVisible(False)
+        self.loading_bar.setVisible(False)
+        self.data_type_layout.addWidget(self.loading_label)
+        self.data_type_layout.addWidget(self.loading_bar)
+
         self.selection_layout = QVBoxLayout(self.selection_tab)
 
         # Inside the selection_layout setup
         self.same_side_checkbox = QCheckBox("Tracks on Same Side")
         self.same_side_checkbox.setChecked(False)
-        self.same_side_checkbox.stateChanged.connect(self.update_plot_visibility)
+        self.same_side_checkbox.stateChanged.connect(self.schedule_plot_update)
         self.selection_layout.addWidget(self.same_side_checkbox)
 
         self.different_side_checkbox = QCheckBox("Tracks on Different Side")
         self.different_side_checkbox.setChecked(False)
-        self.different_side_checkbox.stateChanged.connect(self.update_plot_visibility)
+        self.different_side_checkbox.stateChanged.connect(self.schedule_plot_update)
         self.selection_layout.addWidget(self.different_side_checkbox)
 
         # Energy Controls
@@ -163,40 +223,55 @@ class MainWindow(QMainWindow):
 
         self.event_number_label = QLabel()
         self.event_number_label.setAlignment(Qt.AlignCenter)
+        font = QFont()
+        font.setPointSize(30)
+        self.event_number_label.setFont(font)
+        self.event_number_label.setStyleSheet("color: black;")
         self.real_events_layout.addWidget(self.event_number_label)
 
+        # Rows behind the displayed event
+        self.event_detail_panel = EventDetailPanel()
+        self.real_events_layout.addWidget(self.event_detail_panel)
+
+        self.thumbnail_strip = ThumbnailStrip()
+        self.thumbnail_strip.event_selected.connect(self.on_thumbnail_selected)
+        self.real_events_layout.addWidget(self.thumbnail_strip)
+
         self.prev_button.setVisible(False)
         self.next_button.setVisible(False)
         self.image_label.setVisible(False)
+        self.event_detail_panel.setVisible(False)
         self.event_number_label.setVisible(False)
+        self.thumbnail_strip.setVisible(False)
 
         self.analysis_layout = QVBoxLayout(self.analysis_plots_standard_tab)
 
         checkbox_layout = QHBoxLayout()
         self.total_energy_checkbox = QCheckBox("Show Total Energy")
         self.total_energy_checkbox.setChecked(True)
-        self.total_energy_checkbox.stateChanged.connect(self.update_plot_visibility)
+        self.total_energy_checkbox.stateChanged.connect(self.schedule_plot_update)
 
         self.individual_energy_checkbox = QCheckBox("Show Individual Calo Energy")
         self.individual_energy_checkbox.setChecked(True)
-        self.individual_energy_checkbox.stateChanged.connect(self.update_plot_visibility)
+        self.individual_energy_checkbox.stateChanged.connect(self.schedule_plot_update)
 
         checkbox_layout.addWidget(self.total_energy_checkbox)
         checkbox_layout.addWidget(self.individual_energy_checkbox)
         self.analysis_layout.addLayout(checkbox_layout)
 
         plot_grid_layout = QGridLayout()
-        self.figure = plt.figure(figsize=(5, 5))
-        self.canvas = FigureCanvas(self.figure)
-        plot_grid_layout.addWidget(self.canvas, 0, 0)
+        self.total_energy_panel = HistogramPanel(
+            "Summed Energy per Event", "Total Energy (MeV)", 'blue')
+        plot_grid_layout.addWidget(self.total_energy_panel.canvas, 0, 0)
 
-        self.figure_individual = plt.figure(figsize=(5, 5))
-        self.canvas_individual = FigureCanvas(self.figure_individual)
-        plot_grid_layout.addWidget(self.canvas_individual, 0, 1)
+        self.individual_energy_panel = HistogramPanel(
+            "Summed Energy per Activated OM", "Calo Energy (MeV)", 'green',
+            depends_on_cuts=False)
+        plot_grid_layout.addWidget(self.individual_energy_panel.canvas, 0, 1)
 
-        self.figure_calo_timing = plt.figure(figsize=(5, 5))
-        self.canvas_calo_timing = FigureCanvas(self.figure_calo_timing)
-        plot_grid_layout.addWidget(self.canvas_calo_timing, 1, 0)
+        self.calo_timing_panel = HistogramPanel(
+            "Time Difference Between First and Last Calo Hit", "Time Difference (ns)", 'orange')
+        plot_grid_layout.addWidget(self.calo_timing_panel.canvas, 1, 0)
 
         self.figure_calo_timing2 = plt.figure(figsize=(5, 5))
         self.canvas_calo_timing2 = FigureCanvas(self.figure_calo_timing2)
@@ -204,8 +279,27 @@ class MainWindow(QMainWindow):
 
         self.analysis_layout.addLayout(plot_grid_layout)
 
-        self.valid_event_indices = []
+        self.valid_event_indices = np.array([], dtype=np.int64)
         self.event_index = 0
+        self.dataset_cache = DatasetLRU(fingerprint=dataset_fingerprint)
+        self.pixmap_cache = PixmapCache(parent=self)
+        self.event_detail_cache = EventDetailCache(parent=self)
+        # Reads pics_bg.snpack when it has been built, else the loose PNGs;
+        # wrapped per dataset so events without an image are drawn instead
+        self.prerendered_images = open_image_source(self.BASE_DIR)
+        self.image_source = self.prerendered_images
+        self.df = None
+        self.loading = False
+        self.load_request_id = 0
+        self.load_threads = []
+        self.pending_option = None
+
+        # Rapid clicks restart this timer, so a burst of cut changes ends
+        # in a single recompute and redraw once the user pauses
+        self.plot_update_timer = QTimer(self)
+        self.plot_update_timer.setSingleShot(True)
+        self.plot_update_timer.setInterval(self.PLOT_UPDATE_DELAY_MS)
+        self.plot_update_timer.timeout.connect(self.update_plot_visibility)
 
         self.data_type.setObjectName("dataTypeTab")
         self.selection_tab.setObjectName("selectionTab")
@@ -256,14 +350,30 @@ class MainWindow(QMainWindow):
         self.prev_button.setVisible(True)
         self.next_button.setVisible(True)
         self.image_label.setVisible(True)
+        self.event_detail_panel.setVisible(True)
         self.event_number_label.setVisible(True)
+        self.thumbnail_strip.setVisible(True)
         self.show_events_button.setVisible(False)
         self.next_event()
 
+    def choose_run_directory(self):
+        run_dir = QFileDialog.getExistingDirectory(self, "Select a directory of run databases")
+        if run_dir:
+            self.add_run_set(run_dir)
+
+    def add_run_set(self, spec):
+        label = f"Runs: {spec} ({len(expand_database_paths(spec))} files)"
+        self.run_sets[label] = spec
+        if self.data_type_dropdown.findText(label) < 0:
+            self.data_type_dropdown.addItem(label)
+        self.data_type_dropdown.setCurrentText(label)
+
     def on_data_type_change(self):
         selected_option = self.data_type_dropdown.currentText()
         
-        if selected_option == "Background":
+        if selected_option in self.run_sets:
+            database_path = self.run_sets[selected_option]
+        elif selected_option == "Background":
             database_path = "sq_SN_database_bg_big.db"
         elif selected_option == "Bismuth Source":
             database_path = "sq_SN_database_bismuth_big.db"
@@ -272,164 +382,207 @@ class MainWindow(QMainWindow):
         else:
             database_path = "sq_SN_database_bg_big.db"  # Default option
         
+        self.pending_option = selected_option
         self.load_data(database_path)
-        self.update_plot_visibility()
-        print(f"Connected to {selected_option} database")
 
     def load_data(self, database_path):
-        conn = sqlite3.connect(database_path)
-        
-        try:
-            # Queries here...
-            track_query = """
-            SELECT event_number,
-                COUNT(*) AS num_tracks
-            FROM tracks
-            GROUP BY event_number
-            """
-            self.df_tracks = pd.read_sql_query(track_query, conn)
-
-            calo_query = """
-            SELECT event_number,
-                energy,
-                SUM(energy) OVER(PARTITION BY event_number) AS total_energy
-            FROM calo_hits
-            """
-            self.df_calo = pd.read_sql_query(calo_query, conn)
-
-            time_diff_query = """
-            SELECT event_number,
-                MAX(calo_hit_time) - MIN(calo_hit_time) AS time_diff
-            FROM calo_hits
-            WHERE event_number IN (
-                SELECT event_number
-                FROM tracks
-                WHERE event_number IN (
-                    SELECT event_number
-                    FROM calo_hits
-                    GROUP BY event_number
-                    HAVING COUNT(*) > 1
-                )
-                GROUP BY event_number
-                HAVING COUNT(*) > 1
-            )
-            GROUP BY event_number
-            """
-            self.df_time_diff = pd.read_sql_query(time_diff_query, conn)
-
-            calo_hits_query = """
-            SELECT event_number,
-                COUNT(*) AS num_calo_hits
-            FROM calo_hits
-            GROUP BY event_number
-            """
-            self.df_calo_hits = pd.read_sql_query(calo_hits_query, conn)
-
-            # Query to check if S is equal or different for all tracks
-            s_check_query = """
-            SELECT event_number,
-                CASE
-                    WHEN COUNT(DISTINCT S) = 1 THEN 'Equal'
-                    ELSE 'Different'
-                END AS s_status
-            FROM tracks
-            GROUP BY event_number
-            """
-            self.df_s_check = pd.read_sql_query(s_check_query, conn)
-
-            # Merge all dataframes
-            self.df = pd.merge(self.df_tracks, self.df_calo.drop(columns='energy'), on="event_number", how="outer")
-            self.df = pd.merge(self.df, self.df_calo_hits, on="event_number", how="outer")
-            self.df = pd.merge(self.df, self.df_s_check, on="event_number", how="outer")
-
-        finally:
-            conn.close()
+        # Any load still running is for a selection the user has moved away from
+        self.load_request_id += 1
+        for thread in self.load_threads:
+            thread.cancel()
+
+        frames = self.dataset_cache.get(database_path)
+        if frames is not None:
+            self.set_dataset(database_path, frames)
+            return
+
+        self.show_loading_state()
+        thread = DatasetLoadThread(self.load_request_id, database_path, self)
+        thread.progress.connect(self.on_load_progress)
+        thread.loaded.connect(self.on_dataset_loaded)
+        thread.failed.connect(self.on_load_failed)
+        thread.finished.connect(self.on_load_thread_finished)
+        self.load_threads.append(thread)
+        thread.start()
+
+    def show_loading_state(self):
+        self.loading = True
+        self.loading_label.setText(f"Loading {self.pending_option}...")
+        self.loading_bar.setRange(0, 0)
+        self.loading_label.setVisible(True)
+        self.loading_bar.setVisible(True)
+        self.show_panel_message("Loading...")
+
+    def show_panel_message(self, text):
+        for panel in [self.total_energy_panel, self.individual_energy_panel,
+                      self.calo_timing_panel]:
+            panel.show_message(text)
+
+    def on_load_progress(self, step, total, message):
+        self.loading_bar.setRange(0, total)
+        self.loading_bar.setValue(step)
+        if message:
+            self.loading_label.setText(f"Loading {self.pending_option}: {message}...")
+
+    def on_dataset_loaded(self, request_id, database_path, frames):
+        self.dataset_cache.put(database_path, frames)
+        if request_id != self.load_request_id:
+            return
+        self.set_dataset(database_path, frames)
+
+    def on_load_failed(self, request_id, database_path, message):
+        if request_id != self.load_request_id:
+            return
+        # Nothing from the previous selection stays on screen under the
+        # new one's name
+        self.loading = False
+        self.df = None
+        self.valid_event_indices = np.array([], dtype=np.int64)
+        self.event_index = 0
+        self.thumbnail_strip.set_events(self.valid_event_indices, self.image_source)
+        self.loading_label.setText(f"Failed to load {database_path}: {message}")
+        self.loading_bar.setVisible(False)
+        self.show_panel_message("No data")
+        if self.image_label.isVisible():
+            self.load_image()
+
+    def on_load_thread_finished(self):
+        self.load_threads.remove(self.sender())
+
+    def set_dataset(self, database_path, frames):
+        # Swap all frames together so the plots never mix two datasets
+        self.df = frames["df"]
+        self.histograms = frames["histograms"]
+        self.event_cuts = frames["event_cuts"]
+        if "runs" in frames:
+            # The pre-rendered images are numbered by event only, so merged
+            # runs are always drawn from their own databases
+            self.image_source = RunImageSource(
+                [RenderedImageSource(path) for path in frames["runs"]["path"]])
+        else:
+            self.image_source = RenderedImageSource(database_path, self.prerendered_images)
+        self.event_index = 0
+        self.loading = False
+        self.loading_label.setVisible(False)
+        self.loading_bar.setVisible(False)
+        print(self.dataset_cache.report())
+        print(pool.report())
+
+        self.update_plot_visibility()
+        if self.image_label.isVisible():
+            self.load_image()
+        print(f"Connected to {self.pending_option} database")
+
+    def closeEvent(self, event):
+        for thread in self.load_threads:
+            thread.cancel()
+        for thread in list(self.load_threads):
+            thread.wait()
+        self.pixmap_cache.thread_pool.waitForDone()
+        self.event_detail_cache.thread_pool.waitForDone()
+        self.thumbnail_strip.thumbnail_model.thread_pool.waitForDone()
+        pool.close_all()
+        super().closeEvent(event)
 
 
 # Define increment and decrement methods
     def increment_calo_hits_min(self):
         min_hits = int(self.calo_hits_min_label.text().split()[-1])
-        min_hits += 1
+        if min_hits < MAX_CALO_HITS_CUT:
+            min_hits += 1
         self.calo_hits_min_label.setText(f"Min Calo Hits: {min_hits}")
-        self.update_plot_visibility()
+        self.schedule_plot_update()
 
     def decrement_calo_hits_min(self):
         min_hits = int(self.calo_hits_min_label.text().split()[-1])
         if min_hits > 0:
             min_hits -= 1
         self.calo_hits_min_label.setText(f"Min Calo Hits: {min_hits}")
-        self.update_plot_visibility()
+        self.schedule_plot_update()
 
     def increment_calo_hits_max(self):
         max_hits = int(self.calo_hits_max_label.text().split()[-1])
-        max_hits += 1
+        if max_hits < MAX_CALO_HITS_CUT:
+            max_hits += 1
         self.calo_hits_max_label.setText(f"Max Calo Hits: {max_hits}")
-        self.update_plot_visibility()
+        self.schedule_plot_update()
 
     def decrement_calo_hits_max(self):
         max_hits = int(self.calo_hits_max_label.text().split()[-1])
         if max_hits > 0:
             max_hits -= 1
         self.calo_hits_max_label.setText(f"Max Calo Hits: {max_hits}")
-        self.update_plot_visibility()
+        self.schedule_plot_update()
 
 
     def increment_energy_min(self):
         min_energy = int(self.energy_min_label.text().split()[-1])
-        min_energy += 1
+        if min_energy < MAX_ENERGY_CUT:
+            min_energy += 1
         self.energy_min_label.setText(f"Min Energy: {min_energy}")
-        self.update_plot_visibility()
+        self.schedule_plot_update()
 
     def decrement_energy_min(self):
         min_energy = int(self.energy_min_label.text().split()[-1])
         if min_energy > 0:
             min_energy -= 1
         self.energy_min_label.setText(f"Min Energy: {min_energy}")
-        self.update_plot_visibility()
+        self.schedule_plot_update()
 
     def increment_energy_max(self):
         max_energy = int(self.energy_max_label.text().split()[-1])
-        max_energy += 1
+        if max_energy < MAX_ENERGY_CUT:
+            max_energy += 1
         self.energy_max_label.setText(f"Max Energy: {max_energy}")
-        self.update_plot_visibility()
+        self.schedule_plot_update()
 
     def decrement_energy_max(self):
         max_energy = int(self.energy_max_label.text().split()[-1])
         if max_energy > 0:
             max_energy -= 1
         self.energy_max_label.setText(f"Max Energy: {max_energy}")
-        self.update_plot_visibility()
+        self.schedule_plot_update()
 
     def increment_vertex_min(self):
         min_vertices = int(self.vertex_min_label.text().split()[-1])
-        min_vertices += 1
+        if min_vertices < MAX_TRACKS_CUT:
+            min_vertices += 1
         self.vertex_min_label.setText(f"Min No. Tracks: {min_vertices}")
-        self.update_plot_visibility()
+        self.schedule_plot_update()
 
     def decrement_vertex_min(self):
         min_vertices = int(self.vertex_min_label.text().split()[-1])
         if min_vertices > 0:
             min_vertices -= 1
         self.vertex_min_label.setText(f"Min No. Tracks: {min_vertices}")
-        self.update_plot_visibility()
+        self.schedule_plot_update()
 
     def increment_vertex_max(self):
         max_vertices = int(self.vertex_max_label.text().split()[-1])
-        max_vertices += 1
+        if max_vertices < MAX_TRACKS_CUT:
+            max_vertices += 1
         self.vertex_max_label.setText(f"Max No. Tracks: {max_vertices}")
-        self.update_plot_visibility()
+        self.schedule_plot_update()
 
     def decrement_vertex_max(self):
         max_vertices = int(self.vertex_max_label.text().split()[-1])
         if max_vertices > 0:
             max_vertices -= 1
         self.vertex_max_label.setText(f"Max No. Tracks: {max_vertices}")
-        self.update_plot_visibility()
+        self.schedule_plot_update()
+
 
 
 
+    def schedule_plot_update(self):
+        self.plot_update_timer.start()
 
     def update_plot_visibility(self):
+        # Anything still queued is covered by this pass
+        self.plot_update_timer.stop()
+        if self.df is None or self.loading:
+            return
+
         min_energy = int(self.energy_min_label.text().split()[-1])
         max_energy = int(self.energy_max_label.text().split()[-1])
         min_vertices = int(self.vertex_min_label.text().split()[-1])
@@ -441,102 +594,99 @@ class MainWindow(QMainWindow):
         same_side = self.same_side_checkbox.isChecked()
         different_side = self.different_side_checkbox.isChecked()
 
-        filtered_df = self.df[
-            (self.df['total_energy'] >= min_energy) &
-            (self.df['total_energy'] <= max_energy) &
-            (self.df['num_tracks'] >= min_vertices) &
-            (self.df['num_tracks'] <= max_vertices) &
-            (self.df['num_calo_hits'] >= min_calo_hits) &
-            (self.df['num_calo_hits'] <= max_calo_hits)
-        ]
-
-        self.valid_event_indices = filtered_df['event_number'].tolist()
-
-
-
-        if same_side:
-            filtered_df = filtered_df[filtered_df['s_status'] == 'Equal']
-
-        if different_side:
-            filtered_df = filtered_df[filtered_df['s_status'] == 'Different']
-
-     
-        self.valid_event_indices = filtered_df['event_number'].tolist()
+        cuts = (min_energy, max_energy, min_vertices, max_vertices,
+                min_calo_hits, max_calo_hits, same_side, different_side)
 
+        self.valid_event_indices = self.event_cuts.selected_event_numbers(*cuts)
+        self.thumbnail_strip.set_events(self.valid_event_indices, self.image_source)
 
+        # Histograms come from the pre-binned counts, not from the selection
 
+        # Panels on a hidden tab are left stale and caught up when it is shown
+        analysis_visible = self.bottom_tabs.currentWidget() is self.analysis_plots_standard_tab
+        histograms = self.histograms
 
         if self.total_energy_checkbox.isChecked():
-            self.figure.clear()
-            ax1 = self.figure.add_subplot(111)
-            ax1.hist(filtered_df['total_energy'], bins=50, color='blue', alpha=0.7)
-            ax1.set_title("Summed Energy per Event")
-            ax1.set_xlabel("Total Energy (MeV)")
-            ax1.set_ylabel("Frequency")
-            self.canvas.draw()
-            self.canvas.setVisible(True)
+            self.total_energy_panel.canvas.setVisible(True)
+            if analysis_visible:
+                self.total_energy_panel.refresh(
+                    histograms, cuts, lambda: histograms.total_energy(*cuts))
         else:
-            self.canvas.setVisible(False)
+            self.total_energy_panel.canvas.setVisible(False)
 
         if self.individual_energy_checkbox.isChecked():
-            self.figure_individual.clear()
-            ax2 = self.figure_individual.add_subplot(111)
-            ax2.hist(self.df_calo['energy'], bins=50, color='green', alpha=0.7)
-            ax2.set_title("Summed Energy per Activated OM")
-            ax2.set_xlabel("Calo Energy (MeV)")
-            ax2.set_ylabel("Frequency")
-            self.canvas_individual.draw()
-            self.canvas_individual.setVisible(True)
+            self.individual_energy_panel.canvas.setVisible(True)
+            if analysis_visible:
+                self.individual_energy_panel.refresh(
+                    histograms, cuts,
+                    lambda: (histograms.calo_energy_counts, histograms.calo_energy_edges))
         else:
-            self.canvas_individual.setVisible(False)
+            self.individual_energy_panel.canvas.setVisible(False)
 
-        filtered_time_diff = self.df_time_diff[
-            self.df_time_diff['event_number'].isin(filtered_df['event_number'])
-        ]
+        self.calo_timing_panel.canvas.setVisible(True)
+        if analysis_visible:
+            self.calo_timing_panel.refresh(histograms, cuts, lambda: histograms.time_diff(*cuts))
 
-        self.figure_calo_timing.clear()
-        ax3 = self.figure_calo_timing.add_subplot(111)
-        ax3.hist(filtered_time_diff['time_diff'], bins=50,range=(0, 10), color='orange', alpha=0.7)
-        ax3.set_title("Time Difference Between First and Last Calo Hit")
-        ax3.set_xlabel("Time Difference (ns)")
-        ax3.set_ylabel("Frequency")
-        self.canvas_calo_timing.draw()
-        self.canvas_calo_timing.setVisible(True)
+    def on_bottom_tab_change(self):
+        if self.bottom_tabs.currentWidget() is self.analysis_plots_standard_tab:
+            self.update_plot_visibility()
 
     def load_image(self):
-        if self.valid_event_indices:
+        if len(self.valid_event_indices):
             try:
                 event_number = self.valid_event_indices[self.event_index]
-                image_path = os.path.join(self.BASE_DIR, f"1295_{int(event_number)}.png")
-                if os.path.exists(image_path):
-                    original_pixmap = QPixmap(image_path)
-                    self.image_label.setPixmap(original_pixmap)
+                pixmap = self.pixmap_cache.get(self.image_source, int(event_number))
+                if pixmap is not None:
+                    self.image_label.setPixmap(pixmap)
                 else:
                     self.image_label.setText("Image not found")
                 
-                self.event_number_label.setText(f"Event Number: {event_number}")
-                font = QFont()
-                font.setPointSize(30)
-                self.event_number_label.setFont(font)
-                self.event_number_label.setStyleSheet("color: black;")
+                event_label = getattr(self.image_source, "event_label", str)(event_number)
+                self.event_number_label.setText(f"Event Number: {event_label}")
+                self.event_detail_panel.show_details(
+                    self.event_detail_cache.get(self.image_source, int(event_number)))
+                self.thumbnail_strip.select_row(self.event_index)
+                self.prefetch_neighbour_images()
             except Exception:
                 self.image_label.setText("Image not found")
                 self.event_number_label.setText("")
+                self.event_detail_panel.show_details(None)
         else:
             self.image_label.setText("No valid images")
             self.event_number_label.setText("")
+            self.event_detail_panel.show_details(None)
+
+    def prefetch_neighbour_images(self):
+        # Nearest events first, alternating forwards and backwards
+        event_numbers = []
+        for offset in range(1, self.PREFETCH_EVENTS + 1):
+            for index in (self.event_index + offset, self.event_index - offset):
+                if 0 <= index < len(self.valid_event_indices):
+                    event_numbers.append(int(self.valid_event_indices[index]))
+        self.pixmap_cache.prefetch(self.image_source, event_numbers)
+        self.event_detail_cache.prefetch(self.image_source, event_numbers)
+
+    def on_thumbnail_selected(self, row):
+        self.event_index = row
+        self.load_image()
 
     def next_event(self):
-        if self.valid_event_indices and self.event_index < len(self.valid_event_indices) - 1:
+        if self.event_index < len(self.valid_event_indices) - 1:
             self.event_index += 1
             self.load_image()
 
     def previous_event(self):
-        if self.valid_event_indices and self.event_index > 0:
+        if len(self.valid_event_indices) and self.event_index > 0:
             self.event_index -= 1
             self.load_image()
 
-app = QApplication(sys.argv)
-window = MainWindow()
-window.show()
-sys.exit(app.exec_())
+if __name__ == "__main__":
+    # Guarded so worker processes spawned by run_merge can import this
+    # module's dependencies without starting a second GUI
+    app = QApplication(sys.argv)
+    window = MainWindow()
+    # python main_gui.py <directory or glob> opens a set of runs
+    if len(sys.argv) > 1 and is_run_set(sys.argv[1]):
+        window.add_run_set(sys.argv[1])
+    window.show()
+    sys.exit(app.exec_())
@@ -0,0 +1,66 @@
+import numpy as np
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+
+
+class HistogramPanel:
+    # One persistent figure, axes and bar container per plot. New counts
+    # are written into the existing bars and the canvas is redrawn lazily,
+    # so a cut change never rebuilds axes, ticks or patches.
+    #
+    # Each panel also records the inputs it was last drawn from (the
+    # dataset's histograms, plus the cuts if depends_on_cuts) and skips
+    # redrawing when they have not changed.
+
+    def __init__(self, title, xlabel, color, depends_on_cuts=True):
+        self.figure = Figure(figsize=(5, 5))
+        self.canvas = FigureCanvas(self.figure)
+        self.color = color
+        self.depends_on_cuts = depends_on_cuts
+        self.drawn_inputs = None
+
+        self.ax = self.figure.add_subplot(111)
+        self.ax.set_title(title)
+        self.ax.set_xlabel(xlabel)
+        self.ax.set_ylabel("Frequency")
+
+        self.bars = None
+        self.message = self.ax.text(0.5, 0.5, "", transform=self.ax.transAxes,
+                                    ha="center", va="center", fontsize=16)
+
+    def refresh(self, histograms, cuts, compute):
+        inputs = (histograms, cuts if self.depends_on_cuts else None)
+        if inputs == self.drawn_inputs:
+            return False
+        self.set_histogram(*compute())
+        self.drawn_inputs = inputs
+        return True
+
+    def set_histogram(self, counts, edges):
+        widths = np.diff(edges)
+        if self.bars is None or len(self.bars) != len(counts):
+            if self.bars is not None:
+                self.bars.remove()
+            self.bars = self.ax.bar(edges[:-1], counts, width=widths, align="edge",
+                                    color=self.color, alpha=0.7)
+        else:
+            for bar, left, width, height in zip(self.bars, edges[:-1], widths, counts):
+                bar.set_x(left)
+                bar.set_width(width)
+                bar.set_height(height)
+
+        # Limits set directly: relim() walks every patch and costs more
+        # than the bar updates themselves
+        margin = 0.05 * (edges[-1] - edges[0]) or 0.5
+        self.ax.set_xlim(edges[0] - margin, edges[-1] + margin)
+        self.ax.set_ylim(0, max(np.max(counts), 1) * 1.05)
+        self.message.set_text("")
+        self.canvas.draw_idle()
+
+    def show_message(self, text):
+        self.drawn_inputs = None
+        if self.bars is not None:
+            for bar in self.bars:
+                bar.set_height(0)
+        self.message.set_text(text)
+        self.canvas.draw_idle()
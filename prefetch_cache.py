@@ -0,0 +1,77 @@
+from collections import OrderedDict
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class PrefetchSignals(QObject):
+    loaded = pyqtSignal(object, object)
+
+
+class PrefetchTask(QRunnable):
+    def __init__(self, load, source, event_number, signals):
+        super().__init__()
+        self.load = load
+        self.source = source
+        self.event_number = event_number
+        self.signals = signals
+
+    def run(self):
+        value = self.load(self.source, self.event_number)
+        self.signals.loaded.emit((self.source.name, self.event_number), value)
+
+
+class PrefetchCache(QObject):
+    # Bounded LRU of per-event values plus a background prefetcher, keyed
+    # by (source name, event number). Subclasses define load(source,
+    # event_number), which prefetching runs on worker threads, and may
+    # override to_entry() to turn what it returns into the cached value
+    # on the GUI thread. None results are cached too, so a missing event
+    # is not looked up again.
+
+    def __init__(self, max_entries, max_threads, parent=None):
+        super().__init__(parent)
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.pending = set()
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(max_threads)
+        self.signals = PrefetchSignals(self)
+        self.signals.loaded.connect(self.on_loaded)
+
+    def load(self, source, event_number):
+        raise NotImplementedError
+
+    def to_entry(self, value):
+        return value
+
+    def get(self, source, event_number):
+        key = (source.name, event_number)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        entry = self.to_entry(self.load(source, event_number))
+        self.store(key, entry)
+        return entry
+
+    def prefetch(self, source, event_numbers):
+        for event_number in event_numbers:
+            key = (source.name, event_number)
+            if key in self.entries or key in self.pending:
+                continue
+            self.pending.add(key)
+            self.thread_pool.start(PrefetchTask(self.load, source, event_number, self.signals))
+
+    def on_loaded(self, key, value):
+        self.pending.discard(key)
+        if key not in self.entries:
+            self.store(key, self.to_entry(value))
+
+    def store(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
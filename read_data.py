@@ -1,34 +1,28 @@
 import sqlite3
 
+from db_pool import pool
+
 def print_all_info(db_path):
     try:
-        # Connect to the SQLite database
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        # Query and print all data from the `events` table
-        print("Events Table:")
-        cursor.execute("SELECT * FROM events;")
-        events = cursor.fetchall()
-        for event in events:
-            print(event)
-
-        # Query and print all data from the `tracks` table
-        print("\nTracks Table:")
-        cursor.execute("SELECT * FROM tracks;")
-        tracks = cursor.fetchall()
-        for track in tracks:
-            print(track)
-
-        # Query and print all data from the `calo_hits` table
-        print("\nCalo Hits Table:")
-        cursor.execute("SELECT * FROM calo_hits;")
-        calo_hits = cursor.fetchall()
-        for hit in calo_hits:
-            print(hit)
-
-        # Close the connection
-        conn.close()
+        # Read-only connection from the shared pool
+        with pool.connection(db_path) as conn:
+            cursor = conn.cursor()
+
+            # Query and print all data from the `events` table
+            print("Events Table:")
+            # Iterate the cursor so rows are printed as they are read
+            for event in cursor.execute("SELECT * FROM events;"):
+                print(event)
+
+            # Query and print all data from the `tracks` table
+            print("\nTracks Table:")
+            for track in cursor.execute("SELECT * FROM tracks;"):
+                print(track)
+
+            # Query and print all data from the `calo_hits` table
+            print("\nCalo Hits Table:")
+            for hit in cursor.execute("SELECT * FROM calo_hits;"):
+                print(hit)
 
     except sqlite3.Error as e:
         print(f"An error occurred: {e}")
@@ -38,4 +32,4 @@ if __name__ == "__main__":
     database_path = "sq_SN_database.db"
 
     # Print all information from the database
-    print_all_info(database_path)
\ No newline at end of file
+    print_all_info(database_path)
@@ -0,0 +1,142 @@
+import glob
+import hashlib
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from dataset_cache import database_fingerprint
+from dataset_loader import LoadCancelled, load_frames
+from event_store import RUN_COLUMN, compact_events, footprint_report, split_event_key
+
+
+def is_run_set(spec):
+    return os.path.isdir(spec) or glob.has_magic(spec)
+
+
+def expand_database_paths(spec):
+    # A directory of .db files, a glob pattern, or a single database
+    if os.path.isdir(spec):
+        paths = glob.glob(os.path.join(spec, "*.db"))
+    elif glob.has_magic(spec):
+        paths = glob.glob(spec)
+    else:
+        paths = [spec] if os.path.exists(spec) else []
+    return sorted(path for path in paths if os.path.isfile(path))
+
+
+def dataset_fingerprint(spec):
+    # Changes when any run is added, removed or rewritten; None when there
+    # is nothing to load
+    if not is_run_set(spec):
+        return database_fingerprint(spec) if os.path.exists(spec) else None
+    paths = expand_database_paths(spec)
+    if not paths:
+        return None
+    key = "\n".join(database_fingerprint(path) for path in paths)
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def load_run(database_path):
+    # Runs in a worker process. load_frames keeps each run's summary in
+    # the disk cache, so only new or changed runs are recomputed.
+    return database_path, load_frames(database_path)
+
+
+def run_in_pool(worker, jobs, num_workers, is_cancelled=None, on_result=None):
+    # Spawned rather than forked, as this is called from a Qt worker thread.
+    # An executor rather than a Pool so a crashed worker raises instead of
+    # leaving the load hanging.
+    executor = ProcessPoolExecutor(num_workers, mp_context=multiprocessing.get_context("spawn"))
+    results = []
+    try:
+        for result in executor.map(worker, jobs):
+            if is_cancelled is not None and is_cancelled():
+                raise LoadCancelled(str(jobs))
+            results.append(result)
+            if on_result is not None:
+                on_result(len(results), len(jobs), result)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results
+
+
+def merge_runs(paths, run_frames):
+    # Event numbers repeat between runs, so the run is kept alongside them
+    df = compact_events(pd.concat([frames["df"].reset_index() for frames in run_frames], ignore_index=True))
+    df[RUN_COLUMN] = np.concatenate([
+        np.full(len(frames["df"]), run, dtype=np.min_scalar_type(len(paths)))
+        for run, frames in enumerate(run_frames)
+    ])
+
+    # Every run's calo energies are counted on the same fine binning
+    # (see event_stream.CaloEnergyHistogram), cached with the run
+    calo_energy = pd.DataFrame({"count": sum(frames["calo_energy"]["count"].to_numpy() for frames in run_frames)})
+    runs = pd.DataFrame({"path": [os.path.abspath(path) for path in paths]})
+    return {"df": df, "calo_energy": calo_energy, "runs": runs}
+
+
+def load_dataset(spec, progress=None, is_cancelled=None, num_workers=None):
+    # A single database loads as before; a run set is loaded one worker
+    # process per run and merged into one store
+    if not is_run_set(spec):
+        return load_frames(spec, progress, is_cancelled)
+
+    paths = expand_database_paths(spec)
+    if not paths:
+        raise FileNotFoundError(f"No databases match {spec}")
+    if num_workers is None:
+        num_workers = min(os.cpu_count() or 1, len(paths))
+
+    def report(done, total, result):
+        if progress is not None:
+            progress(done, total, f"loaded {os.path.basename(result[0])}")
+
+    results = run_in_pool(load_run, paths, num_workers, is_cancelled, report)
+    frames = merge_runs(paths, [frames for _, frames in results])
+    print(f"Merged {len(paths)} runs from {spec}")
+    print(footprint_report(frames))
+    return frames
+
+
+class RunImageSource:
+    # Image source (see image_pack) for a merged store: looks each event
+    # key up in the source of the run it belongs to
+
+    def __init__(self, run_sources):
+        self.run_sources = run_sources
+        self.name = "|".join(source.name for source in run_sources)
+        self.location = "|".join(getattr(source, "location", source.name) for source in run_sources)
+
+    def read_bytes(self, key):
+        run, event_number = split_event_key(key)
+        return self.run_sources[run].read_bytes(event_number)
+
+    def fetch_event_rows(self, key):
+        run, event_number = split_event_key(key)
+        return self.run_sources[run].fetch_event_rows(event_number)
+
+    def event_label(self, key):
+        run, event_number = split_event_key(key)
+        run_name = os.path.splitext(os.path.basename(self.run_sources[run].database_path))[0]
+        return f"{run_name}: {event_number}"
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python run_merge.py <directory or glob> [<workers>]")
+        return
+
+    spec = sys.argv[1]
+    num_workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    start = time.perf_counter()
+    frames = load_dataset(spec, num_workers=num_workers)
+    print(f"{len(frames['df'])} events in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
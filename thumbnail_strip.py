@@ -0,0 +1,183 @@
+import hashlib
+import os
+import shutil
+from collections import OrderedDict
+
+import numpy as np
+from PyQt5.QtCore import (QAbstractListModel, QBuffer, QByteArray, QModelIndex, QObject,
+                          QRunnable, QSize, Qt, QThreadPool, pyqtSignal)
+from PyQt5.QtGui import QImage, QImageReader, QPixmap
+from PyQt5.QtWidgets import QListView
+
+from dataset_cache import CACHE_DIR
+
+THUMBNAIL_SIZE = QSize(240, 60)
+THUMBNAIL_CACHE_DIR = os.path.join(CACHE_DIR, "thumbnails")
+
+
+def short_hash(text):
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+def thumbnail_prefix(source):
+    # Shared by every version of the same images; a source whose name
+    # changes with its data also says where it reads from
+    return f"{short_hash(getattr(source, 'location', source.name))}-"
+
+
+def thumbnail_dir(source):
+    return os.path.join(THUMBNAIL_CACHE_DIR, f"{thumbnail_prefix(source)}{short_hash(source.name)}")
+
+
+def make_thumbnail_dir(source):
+    # Like save_cached_frames, drops the thumbnails of older versions of
+    # the same source when the first one of a new version is saved
+    path = thumbnail_dir(source)
+    if os.path.isdir(path):
+        return path
+    os.makedirs(path, exist_ok=True)
+    prefix = thumbnail_prefix(source)
+    for entry in os.listdir(THUMBNAIL_CACHE_DIR):
+        if entry.startswith(prefix) and os.path.join(THUMBNAIL_CACHE_DIR, entry) != path:
+            shutil.rmtree(os.path.join(THUMBNAIL_CACHE_DIR, entry), ignore_errors=True)
+    return path
+
+
+def load_thumbnail(source, event_number):
+    # Disk cache first; otherwise decode straight to the thumbnail size and
+    # save the result for next time. Safe to run on a worker thread.
+    cache_path = os.path.join(thumbnail_dir(source), f"{int(event_number)}.png")
+    if os.path.exists(cache_path):
+        image = QImage(cache_path)
+        if not image.isNull():
+            return image
+
+    data = source.read_bytes(event_number)
+    if data is None:
+        return None
+    buffer = QBuffer()
+    buffer.setData(QByteArray(bytes(data)))
+    buffer.open(QBuffer.ReadOnly)
+    reader = QImageReader(buffer)
+    original_size = reader.size()
+    if original_size.isValid():
+        reader.setScaledSize(original_size.scaled(THUMBNAIL_SIZE, Qt.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        return None
+
+    make_thumbnail_dir(source)
+    image.save(cache_path + ".tmp", "PNG")
+    os.replace(cache_path + ".tmp", cache_path)
+    return image
+
+
+class ThumbnailSignals(QObject):
+    loaded = pyqtSignal(object, object)
+
+
+class ThumbnailTask(QRunnable):
+    def __init__(self, source, event_number, row, signals):
+        super().__init__()
+        self.source = source
+        self.event_number = event_number
+        self.row = row
+        self.signals = signals
+
+    def run(self):
+        image = load_thumbnail(self.source, self.event_number)
+        self.signals.loaded.emit((self.source.name, self.event_number, self.row), image)
+
+
+class ThumbnailModel(QAbstractListModel):
+    # Qt only asks for the decoration of rows that are on screen, so a
+    # thumbnail is loaded the first time its row is painted and never for
+    # rows the user does not scroll to
+
+    def __init__(self, max_cached=512, parent=None):
+        super().__init__(parent)
+        self.event_numbers = np.array([], dtype=np.int64)
+        self.source = None
+        self.max_cached = max_cached
+        self.thumbnails = OrderedDict()
+        self.pending = set()
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(2)
+        self.signals = ThumbnailSignals(self)
+        self.signals.loaded.connect(self.on_loaded)
+        self.placeholder = QPixmap(THUMBNAIL_SIZE)
+        self.placeholder.fill(Qt.lightGray)
+
+    def set_events(self, event_numbers, source):
+        event_numbers = np.asarray(event_numbers, dtype=np.int64)
+        if np.array_equal(event_numbers, self.event_numbers) and source is self.source:
+            return
+        self.beginResetModel()
+        self.event_numbers = event_numbers
+        self.source = source
+        # Queued loads for the old list are no longer needed
+        self.thread_pool.clear()
+        self.pending.clear()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.event_numbers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        event_number = int(self.event_numbers[index.row()])
+        if role == Qt.DisplayRole:
+            return getattr(self.source, "event_label", str)(event_number)
+        if role == Qt.DecorationRole:
+            key = (self.source.name, event_number)
+            if key in self.thumbnails:
+                self.thumbnails.move_to_end(key)
+                return self.thumbnails[key] or self.placeholder
+            if key not in self.pending:
+                self.pending.add(key)
+                self.thread_pool.start(ThumbnailTask(self.source, event_number, index.row(), self.signals))
+            return self.placeholder
+        return None
+
+    def on_loaded(self, task_key, image):
+        source_name, event_number, row = task_key
+        key = (source_name, event_number)
+        self.pending.discard(key)
+        self.thumbnails[key] = None if image is None else QPixmap.fromImage(image)
+        while len(self.thumbnails) > self.max_cached:
+            self.thumbnails.popitem(last=False)
+
+        # Only repaint if the row still shows that event
+        if self.source is not None and source_name == self.source.name \
+                and row < len(self.event_numbers) and self.event_numbers[row] == event_number:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+
+class ThumbnailStrip(QListView):
+    event_selected = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.thumbnail_model = ThumbnailModel(parent=self)
+        self.setModel(self.thumbnail_model)
+        self.setFlow(QListView.LeftToRight)
+        self.setWrapping(False)
+        self.setViewMode(QListView.IconMode)
+        self.setIconSize(THUMBNAIL_SIZE)
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(QListView.Batched)
+        self.setBatchSize(50)
+        self.setMovement(QListView.Static)
+        self.setFixedHeight(THUMBNAIL_SIZE.height() + 50)
+        self.clicked.connect(lambda index: self.event_selected.emit(index.row()))
+
+    def set_events(self, event_numbers, source):
+        self.thumbnail_model.set_events(event_numbers, source)
+
+    def select_row(self, row):
+        if 0 <= row < self.thumbnail_model.rowCount():
+            index = self.thumbnail_model.index(row)
+            self.setCurrentIndex(index)
+            self.scrollTo(index)
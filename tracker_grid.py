@@ -0,0 +1,126 @@
+import sys
+import time
+
+import numpy as np
+
+
+class TrackerGrid:
+    # Uniform grid over the tracker cells, in the plane across the wires.
+    # Buckets are one cell diameter wide. The grid is cut into slabs along
+    # its shorter axis; a segment overlaps each slab over one run of
+    # buckets, and only the cells in those runs get the exact distance
+    # test.
+
+    def __init__(self, centres, radius):
+        self.centres = np.asarray(centres, dtype=np.float64).reshape(-1, 2)
+        self.radius = float(radius)
+        self.bucket_size = 2 * self.radius
+        self.origin = self.centres.min(axis=0) if len(self.centres) else np.zeros(2)
+        cell_buckets = np.floor((self.centres - self.origin) / self.bucket_size).astype(np.int64)
+        self.shape = cell_buckets.max(axis=0) + 1 if len(self.centres) else np.ones(2, dtype=np.int64)
+        self.slab_axis = int(np.argmin(self.shape))
+        self.run_axis = 1 - self.slab_axis
+
+        # Cells sorted slab by slab and bucket by bucket within a slab, so
+        # any run of buckets in one slab is one contiguous run of cells
+        keys = cell_buckets[:, self.slab_axis] * self.shape[self.run_axis] + cell_buckets[:, self.run_axis]
+        self.cell_order = np.argsort(keys, kind="stable")
+        self.bucket_edges = np.searchsorted(keys[self.cell_order], np.arange(self.shape.prod() + 1))
+
+    def candidate_pairs(self, starts, ends):
+        # (segment, cell) pairs for every cell whose centre could be within
+        # radius of the segment
+        num_slabs, num_runs = self.shape[self.slab_axis], self.shape[self.run_axis]
+        slab_low = self.origin[self.slab_axis] + np.arange(num_slabs) * self.bucket_size - self.radius
+        slab_high = slab_low + self.bucket_size + 2 * self.radius
+
+        # Part of each segment inside each slab (widened by radius), as a
+        # parameter range along the segment
+        start_a = starts[:, self.slab_axis, None]
+        direction_a = (ends - starts)[:, self.slab_axis, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t0 = (slab_low - start_a) / direction_a
+            t1 = (slab_high - start_a) / direction_a
+        parallel = direction_a == 0
+        inside = (start_a >= slab_low) & (start_a < slab_high)
+        # A segment parallel to the slabs is wholly in or out of each one
+        t_low = np.where(parallel, np.where(inside, 0.0, 1.0), np.maximum(np.minimum(t0, t1), 0.0))
+        t_high = np.where(parallel, np.where(inside, 1.0, 0.0), np.minimum(np.maximum(t0, t1), 1.0))
+
+        # Buckets along the other axis that part of the segment comes
+        # within radius of
+        start_b = starts[:, self.run_axis, None]
+        direction_b = (ends - starts)[:, self.run_axis, None]
+        low = np.minimum(start_b + t_low * direction_b, start_b + t_high * direction_b) - self.radius
+        high = np.maximum(start_b + t_low * direction_b, start_b + t_high * direction_b) + self.radius
+        first = np.floor((low - self.origin[self.run_axis]) / self.bucket_size)
+        last = np.floor((high - self.origin[self.run_axis]) / self.bucket_size)
+        overlaps = (t_low <= t_high) & (last >= 0) & (first < num_runs)
+        segment, slab = np.nonzero(overlaps)
+        first = np.clip(first[overlaps], 0, num_runs - 1).astype(np.int64)
+        last = np.clip(last[overlaps], 0, num_runs - 1).astype(np.int64)
+
+        run_starts = self.bucket_edges[slab * num_runs + first]
+        counts = self.bucket_edges[slab * num_runs + last + 1] - run_starts
+        first_cell = np.cumsum(counts) - counts
+        positions = np.arange(counts.sum()) - np.repeat(first_cell - run_starts, counts)
+        return np.repeat(segment, counts), self.cell_order[positions]
+
+    def crossings(self, starts, ends):
+        # Every cell within radius of each segment: (segment, cell, distance
+        # of closest approach) arrays, one entry per crossing
+        starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2)
+        ends = np.asarray(ends, dtype=np.float64).reshape(-1, 2)
+        if not len(starts) or not len(self.centres):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+
+        segment, cell = self.candidate_pairs(starts, ends)
+        direction = (ends - starts)[segment]
+        offset = self.centres[cell] - starts[segment]
+        length_squared = np.maximum(np.einsum("ij,ij->i", direction, direction), 1e-12)
+        t = np.clip(np.einsum("ij,ij->i", offset, direction) / length_squared, 0.0, 1.0)
+        distance = np.hypot(*(offset - t[:, None] * direction).T)
+        crossed = distance < self.radius
+        return segment[crossed], cell[crossed], distance[crossed]
+
+    def crossed_mask(self, starts, ends):
+        crossed = np.zeros(len(self.centres), dtype=bool)
+        crossed[self.crossings(starts, ends)[1]] = True
+        return crossed
+
+
+def brute_force_mask(centres, radius, starts, ends):
+    # Every cell against every segment; the reference crossings() must match
+    crossed = np.zeros(len(centres), dtype=bool)
+    for start, end in zip(starts, ends):
+        direction = end - start
+        t = np.clip((centres - start) @ direction / max(direction @ direction, 1e-12), 0.0, 1.0)
+        crossed |= np.hypot(*(centres - start - t[:, None] * direction).T) < radius
+    return crossed
+
+
+def main():
+    # Times the grid against the brute-force test on the SuperNEMO tracker
+    # layout with random tracks from the foil to the calorimeter walls
+    from event_renderer import CALO_WALL_X, TRACKER_CELL_PITCH, TRACKER_CELL_X, TRACKER_CELL_Y
+
+    num_tracks = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    centres = np.column_stack([TRACKER_CELL_Y, TRACKER_CELL_X])
+    grid = TrackerGrid(centres, TRACKER_CELL_PITCH / 2)
+    rng = np.random.default_rng(0)
+    half_length = np.abs(TRACKER_CELL_Y).max()
+    starts = np.column_stack([rng.uniform(-half_length, half_length, num_tracks), np.zeros(num_tracks)])
+    ends = np.column_stack([rng.uniform(-half_length, half_length, num_tracks),
+                            rng.choice([-1.0, 1.0], num_tracks) * CALO_WALL_X])
+
+    for label, find in (("grid", lambda: grid.crossed_mask(starts, ends)),
+                        ("brute force", lambda: brute_force_mask(centres, grid.radius, starts, ends))):
+        start = time.perf_counter()
+        for _ in range(100):
+            crossed = find()
+        print(f"{label}: {crossed.sum()} cells crossed by {num_tracks} tracks, "
+              f"{(time.perf_counter() - start) * 10:.3f} ms per event")
+
+
+if __name__ == "__main__":
+    main()